@@ -0,0 +1,71 @@
+# activity_fields.py
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+
+# Public field name -> SQL expression on `activities`
+ACTIVITY_FIELDS: Dict[str, str] = {
+    "id": "id",
+    "user_id": "user_id",
+    "start_time": "start_time",
+    "end_time": "end_time",
+    "application": "application",
+    "window_title": "window_title",
+    "screenshot_path": "screenshot_path",
+    "ai_analysis": "ai_analysis",
+    "client_identified": "client_identified",
+    "category": "category",
+    "productivity_score": "productivity_score",
+    "status": "status",
+    "entry_type": "entry_type",
+    # open activities run until now
+    "duration_minutes": "ROUND(EXTRACT(EPOCH FROM (COALESCE(end_time, NOW()) - start_time)) / 60.0, 2)",
+}
+
+# Default column lists (and output order) per endpoint family
+ACTIVITIES_COLUMNS = [
+    'id','user_id','start_time','end_time','application','window_title',
+    'screenshot_path','ai_analysis','client_identified',
+    'category','productivity_score','duration_minutes','status', 'entry_type'
+]
+ADMIN_ACTIVITY_COLUMNS = [
+    "id", "start_time", "end_time", "client_identified", "ai_analysis", "category",
+    "productivity_score", "application", "window_title", "status", "entry_type", "duration_minutes",
+]
+
+
+def project_fields(fields: Optional[str], default: List[str], always: Iterable[str] = ("id",)) -> List[str]:
+    """
+    Resolve a `fields=a,b,c` query parameter against `default` (the endpoint's full
+    column list, which also fixes the output order). Unknown names are a 400;
+    `always` columns are included regardless so ids / cursors keep working.
+    """
+    if not fields:
+        return list(default)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = sorted(requested - set(default))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(default)}"
+        )
+    requested.update(always)
+    return [f for f in default if f in requested]
+
+
+def select_list(columns: List[str], overrides: Optional[Dict[str, str]] = None) -> str:
+    """SQL select list for `columns`; `overrides` replaces the expression for specific fields."""
+    overrides = overrides or {}
+    parts = []
+    for c in columns:
+        expr = overrides.get(c, ACTIVITY_FIELDS[c])
+        parts.append(c if expr == c else f"{expr} AS {c}")
+    return ", ".join(parts)
+
+
+# /api/activities reports no duration for activities that are still open
+ACTIVITIES_OVERRIDES = {
+    "duration_minutes": "CASE WHEN end_time IS NOT NULL THEN EXTRACT(EPOCH FROM (end_time - start_time)) / 60.0 END",
+}
+# Live events carry the same row shape as /api/activities (RETURNING list for writers)
+EVENT_SELECT = select_list(ACTIVITIES_COLUMNS, ACTIVITIES_OVERRIDES)
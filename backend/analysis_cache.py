@@ -0,0 +1,229 @@
+# analysis_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from .db_pool import get_connection
+
+
+load_dotenv()
+
+# ====== Cache config ======
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "1") == "1"
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))       # seconds
+ANALYSIS_CACHE_MEMORY_SIZE = int(os.getenv("ANALYSIS_CACHE_MEMORY_SIZE", "2048"))   # in-process LRU entries
+ANALYSIS_CACHE_MAX_ROWS = int(os.getenv("ANALYSIS_CACHE_MAX_ROWS", "100000"))       # Postgres table cap
+ANALYSIS_CACHE_EVICT_EVERY = int(os.getenv("ANALYSIS_CACHE_EVICT_EVERY", "500"))    # run table eviction every N puts
+
+_WS_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+# "● file.py", "*Untitled", "(3) Inbox" — editor dirty markers and unread counters
+_TITLE_NOISE_RE = re.compile(r"^[\s●•*]+|\(\d+\)")
+
+
+def normalize_window_title(title: str) -> str:
+    title = _TITLE_NOISE_RE.sub(" ", (title or "").lower())
+    return _WS_RE.sub(" ", title).strip()
+
+
+def text_fingerprint(text: str) -> str:
+    """
+    Fingerprint of the OCR text the prompt actually sees (first 2000 chars).
+    Digits are folded so on-screen clocks and counters don't defeat the cache.
+    """
+    text = _DIGITS_RE.sub("#", (text or "")[:2000].lower())
+    text = _WS_RE.sub(" ", text).strip()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def ensure_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            cache_key TEXT PRIMARY KEY,
+            application TEXT,
+            window_title TEXT,
+            text_fingerprint TEXT,
+            variant TEXT,
+            analysis JSONB NOT NULL,
+            raw_response TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            expires_at TIMESTAMP NOT NULL,
+            last_hit_at TIMESTAMP,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires ON analysis_cache (expires_at)")
+
+
+class AnalysisCache:
+    """
+    Two-level cache for LLM analyses: an in-process LRU in front of the
+    `analysis_cache` table, keyed on (application, normalized window title,
+    OCR fingerprint, prompt variant). Entries expire after `ttl` seconds; the
+    LRU holds `memory_size` entries and the table is trimmed to `max_rows`.
+    Any DB error is treated as a miss — the cache must never break analysis.
+    """
+
+    def __init__(self, ttl: int = ANALYSIS_CACHE_TTL, memory_size: int = ANALYSIS_CACHE_MEMORY_SIZE,
+                 max_rows: int = ANALYSIS_CACHE_MAX_ROWS, enabled: bool = ANALYSIS_CACHE_ENABLED):
+        self.ttl = ttl
+        self.memory_size = max(1, memory_size)
+        self.max_rows = max_rows
+        self.enabled = enabled
+        self._lru: "OrderedDict[str, Tuple[float, Dict, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+
+        # metrics
+        self._memory_hits = 0
+        self._db_hits = 0
+        self._misses = 0
+        self._evicted = 0
+
+    @staticmethod
+    def make_key(application: str, window_title: str, extracted_text: str, variant: str) -> Dict:
+        parts = {
+            "application": (application or "").strip().lower(),
+            "window_title": normalize_window_title(window_title),
+            "text_fingerprint": text_fingerprint(extracted_text),
+            "variant": variant,
+        }
+        raw = "\x1f".join([parts["application"], parts["window_title"], parts["text_fingerprint"], variant])
+        parts["cache_key"] = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        return parts
+
+    def get(self, application: str, window_title: str, extracted_text: str, variant: str):
+        """Return (analysis, raw_response) or None."""
+        if not self.enabled:
+            return None
+        key = self.make_key(application, window_title, extracted_text, variant)["cache_key"]
+        now = time.time()
+
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._lru.move_to_end(key)
+                    self._memory_hits += 1
+                    return dict(entry[1]), entry[2]
+                del self._lru[key]
+
+        row = None
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE analysis_cache SET hits = hits + 1, last_hit_at = NOW()
+                WHERE cache_key = %s AND expires_at > NOW()
+                RETURNING analysis, raw_response, EXTRACT(EPOCH FROM (expires_at - NOW()))
+            """, (key,))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print("Analysis cache lookup failed:", str(e))
+
+        with self._lock:
+            if row is None:
+                self._misses += 1
+                return None
+            self._db_hits += 1
+            analysis = row[0] if isinstance(row[0], dict) else json.loads(row[0])
+            self._remember(key, now + float(row[2]), analysis, row[1])
+            return dict(analysis), row[1]
+
+    def put(self, application: str, window_title: str, extracted_text: str, variant: str,
+            analysis: Dict, raw_response: str):
+        if not self.enabled:
+            return
+        key = self.make_key(application, window_title, extracted_text, variant)
+        with self._lock:
+            self._remember(key["cache_key"], time.time() + self.ttl, dict(analysis), raw_response)
+            self._puts += 1
+            evict_now = self._puts % ANALYSIS_CACHE_EVICT_EVERY == 0
+
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO analysis_cache
+                    (cache_key, application, window_title, text_fingerprint, variant, analysis, raw_response, expires_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW() + make_interval(secs => %s))
+                ON CONFLICT (cache_key) DO UPDATE
+                SET analysis = EXCLUDED.analysis,
+                    raw_response = EXCLUDED.raw_response,
+                    created_at = NOW(),
+                    expires_at = EXCLUDED.expires_at
+            """, (
+                key["cache_key"], key["application"], key["window_title"], key["text_fingerprint"],
+                key["variant"], json.dumps(analysis), raw_response, self.ttl
+            ))
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print("Analysis cache store failed:", str(e))
+
+        if evict_now:
+            self.evict()
+
+    def _remember(self, key: str, expires_at: float, analysis: Dict, raw_response: str):
+        # caller holds self._lock
+        self._lru[key] = (expires_at, analysis, raw_response)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_size:
+            self._lru.popitem(last=False)
+
+    def evict(self) -> int:
+        """Drop expired rows, then trim the table to max_rows by least-recent use."""
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            cur.execute("DELETE FROM analysis_cache WHERE expires_at <= NOW()")
+            removed = cur.rowcount
+            cur.execute("""
+                DELETE FROM analysis_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM analysis_cache
+                    ORDER BY COALESCE(last_hit_at, created_at) DESC
+                    OFFSET %s
+                )
+            """, (self.max_rows,))
+            removed += cur.rowcount
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print("Analysis cache eviction failed:", str(e))
+            return 0
+        with self._lock:
+            self._evicted += removed
+        return removed
+
+    def clear_memory(self):
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._memory_hits + self._db_hits + self._misses
+            hits = self._memory_hits + self._db_hits
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._lru),
+                "memory_hits": self._memory_hits,
+                "db_hits": self._db_hits,
+                "misses": self._misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "evicted_rows": self._evicted,
+            }
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,326 @@
+# analysis_jobs.py
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from .db_pool import get_connection
+from .ocr_pool import OCR_WORKERS
+
+
+load_dotenv()
+
+# ====== Queue config ======
+# Each worker blocks on its OCR result, so fewer workers than OCR processes would leave cores
+# idle; never below the old 2, which overlaps one worker's LLM call with another's OCR
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "0")) or max(2, OCR_WORKERS)
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "3"))
+ANALYSIS_RETRY_BACKOFF = float(os.getenv("ANALYSIS_RETRY_BACKOFF", "15"))     # seconds, multiplied by attempt number
+ANALYSIS_POLL_INTERVAL = float(os.getenv("ANALYSIS_POLL_INTERVAL", "5"))      # fallback poll when nobody calls notify()
+ANALYSIS_STALE_AFTER = int(os.getenv("ANALYSIS_STALE_AFTER", "600"))          # requeue 'running' jobs older than this
+ANALYSIS_PAYLOAD_CACHE = int(os.getenv("ANALYSIS_PAYLOAD_CACHE", "64"))        # uploaded images kept in memory for workers
+
+JOB_COLUMNS = ["id", "activity_id", "user_id", "screenshot_path", "application", "window_title", "attempts",
+               "activity_start_time"]
+
+
+def ensure_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id SERIAL PRIMARY KEY,
+            activity_id INTEGER REFERENCES activities(id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            screenshot_path TEXT NOT NULL,
+            application TEXT,
+            window_title TEXT,
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK(status IN ('queued','running','done','failed','superseded')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_pending
+        ON analysis_jobs (run_after, id) WHERE status = 'queued'
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_activity
+        ON analysis_jobs (activity_id, id)
+    """)
+    # Shared by enqueue() and persist_upload_frame() (sessions.py)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION enqueue_analysis_job(
+            p_activity_id INTEGER, p_user_id INTEGER, p_screenshot_path TEXT,
+            p_application TEXT, p_window_title TEXT
+        ) RETURNS INTEGER LANGUAGE sql AS $$
+            UPDATE analysis_jobs SET status = 'superseded', finished_at = NOW()
+            WHERE activity_id = p_activity_id AND status = 'queued';
+            INSERT INTO analysis_jobs (activity_id, user_id, screenshot_path, application, window_title)
+            VALUES (p_activity_id, p_user_id, p_screenshot_path, p_application, p_window_title)
+            RETURNING id;
+        $$
+    """)
+
+
+def ensure_activity_start_time(cur):
+    """
+    Migration 11: jobs carry their activity's start_time, the activities partition key,
+    so the worker's reads and writes of the activity touch one partition.
+    """
+    cur.execute("ALTER TABLE analysis_jobs ADD COLUMN IF NOT EXISTS activity_start_time TIMESTAMP")
+    cur.execute("""
+        UPDATE analysis_jobs j SET activity_start_time = a.start_time
+        FROM activities a
+        WHERE a.id = j.activity_id AND j.status IN ('queued', 'running') AND j.activity_start_time IS NULL
+    """)
+    # Replaces migration 3's 5-argument form; keeping both would make 5-argument calls ambiguous
+    cur.execute("DROP FUNCTION IF EXISTS enqueue_analysis_job(INTEGER, INTEGER, TEXT, TEXT, TEXT)")
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION enqueue_analysis_job(
+            p_activity_id INTEGER, p_user_id INTEGER, p_screenshot_path TEXT,
+            p_application TEXT, p_window_title TEXT, p_activity_start_time TIMESTAMP DEFAULT NULL
+        ) RETURNS INTEGER LANGUAGE sql AS $$
+            UPDATE analysis_jobs SET status = 'superseded', finished_at = NOW()
+            WHERE activity_id = p_activity_id AND status = 'queued';
+            INSERT INTO analysis_jobs (activity_id, user_id, screenshot_path, application, window_title,
+                                       activity_start_time)
+            VALUES (p_activity_id, p_user_id, p_screenshot_path, p_application, p_window_title,
+                    p_activity_start_time)
+            RETURNING id;
+        $$
+    """)
+
+
+def enqueue(cur, activity_id: int, user_id: int, screenshot_path: str,
+            application: str, window_title: str, activity_start_time: Optional[datetime] = None) -> int:
+    """
+    Queue OCR + LLM enrichment for an activity using the caller's cursor, so the job
+    commits atomically with the activity row. Older queued jobs for the same activity
+    are superseded — only the newest frame is worth analysing.
+    """
+    cur.execute(
+        "SELECT enqueue_analysis_job(%s, %s, %s, %s, %s, %s)",
+        (activity_id, user_id, screenshot_path, application, window_title, activity_start_time)
+    )
+    return cur.fetchone()[0]
+
+
+async def job_status_for_activity(db, activity_id: int) -> Optional[Dict]:
+    row = await db.fetch_one("""
+        SELECT id, status, attempts, last_error, created_at, started_at, finished_at
+        FROM analysis_jobs
+        WHERE activity_id = %s
+        ORDER BY id DESC
+        LIMIT 1
+    """, (activity_id,))
+    if not row:
+        return None
+    return {
+        "job_id": row[0],
+        "status": row[1],
+        "attempts": row[2],
+        "last_error": row[3],
+        "created_at": row[4],
+        "started_at": row[5],
+        "finished_at": row[6],
+    }
+
+
+class AnalysisJobQueue:
+    """
+    Postgres-backed job queue with an in-process worker pool.
+
+    Job state lives in `analysis_jobs`, so queued work survives restarts and several
+    API workers can share the table (claims use FOR UPDATE SKIP LOCKED). `handler`
+    receives the job dict and does the actual OCR / LLM / UPDATE; any exception is
+    retried with linear backoff until ANALYSIS_MAX_ATTEMPTS, then the job is marked failed.
+    """
+
+    def __init__(self, handler: Callable[[Dict], None], workers: int = ANALYSIS_WORKERS,
+                 max_attempts: int = ANALYSIS_MAX_ATTEMPTS):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._payloads: "OrderedDict[int, tuple]" = OrderedDict()
+
+        # metrics
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._retried = 0
+        self._run_total = 0.0
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._requeue_stale()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"analysis-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"Analysis job queue started with {self.workers} worker(s)")
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake an idle worker right away instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    def attach_payload(self, job_id: int, image_bytes: bytes, frame_hash: Optional[int] = None):
+        """
+        Keep the uploaded image (and its perceptual hash) in memory for the worker that
+        picks up `job_id`, so OCR doesn't re-read it from disk. Bounded; jobs whose payload
+        was evicted (or that were queued by another process) fall back to the file on disk.
+        """
+        with self._lock:
+            self._payloads[job_id] = (image_bytes, frame_hash)
+            while len(self._payloads) > ANALYSIS_PAYLOAD_CACHE:
+                self._payloads.popitem(last=False)
+
+    # ---- internals ----
+    def _requeue_stale(self):
+        # Jobs left 'running' by a crashed process go back to the queue
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE analysis_jobs SET status = 'queued', run_after = NOW()
+                WHERE status = 'running' AND started_at < NOW() - make_interval(secs => %s)
+            """, (ANALYSIS_STALE_AFTER,))
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print("Analysis queue: could not requeue stale jobs:", str(e))
+
+    def _claim(self) -> Optional[Dict]:
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                UPDATE analysis_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = NOW()
+                WHERE id = (
+                    SELECT id FROM analysis_jobs
+                    WHERE status = 'queued' AND run_after <= NOW()
+                    ORDER BY run_after, id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, activity_id, user_id, screenshot_path, application, window_title, attempts,
+                          activity_start_time
+            """)
+            row = cur.fetchone()
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def _finish(self, job: Dict, error: Optional[str]):
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            if error is None:
+                cur.execute("""
+                    UPDATE analysis_jobs SET status = 'done', last_error = NULL, finished_at = NOW()
+                    WHERE id = %s
+                """, (job["id"],))
+            elif job["attempts"] < self.max_attempts:
+                cur.execute("""
+                    UPDATE analysis_jobs
+                    SET status = 'queued', last_error = %s,
+                        run_after = NOW() + make_interval(secs => %s)
+                    WHERE id = %s
+                """, (error, ANALYSIS_RETRY_BACKOFF * job["attempts"], job["id"]))
+            else:
+                cur.execute("""
+                    UPDATE analysis_jobs SET status = 'failed', last_error = %s, finished_at = NOW()
+                    WHERE id = %s
+                """, (error, job["id"]))
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                print("Analysis queue: claim failed:", str(e))
+                job = None
+
+            if job is None:
+                self._wakeup.wait(ANALYSIS_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            started = time.monotonic()
+            with self._lock:
+                self._busy += 1
+                job["image_bytes"], job["frame_hash"] = self._payloads.pop(job["id"], (None, None))
+            error = None
+            try:
+                self.handler(job)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                print(f"❌ Analysis job {job['id']} (activity {job['activity_id']}) failed:", error)
+                traceback.print_exc()
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._run_total += time.monotonic() - started
+                    if error is None:
+                        self._completed += 1
+                    elif job["attempts"] < self.max_attempts:
+                        self._retried += 1
+                        # keep the image in memory for the retry
+                        if job["image_bytes"] is not None:
+                            self._payloads[job["id"]] = (job["image_bytes"], job["frame_hash"])
+                    else:
+                        self._failed += 1
+
+            try:
+                self._finish(job, error)
+            except Exception as e:
+                print("Analysis queue: could not record job result:", str(e))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            finished = self._completed + self._failed + self._retried
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "completed": self._completed,
+                "retried": self._retried,
+                "failed": self._failed,
+                "avg_run_ms": round(self._run_total / finished * 1000, 1) if finished else 0.0,
+            }
+
+    def backlog(self) -> Dict:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT status, COUNT(*) FROM analysis_jobs WHERE status IN ('queued','running') GROUP BY status")
+        counts = {r[0]: r[1] for r in cur.fetchall()}
+        cur.close()
+        conn.close()
+        return {"queued": counts.get("queued", 0), "running": counts.get("running", 0)}
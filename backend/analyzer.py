@@ -0,0 +1,196 @@
+# analyzer.py
+"""
+ActivityAnalyzer: OCR + LLM analysis of a window / screenshot, shared by the API
+(manual entries, background analysis jobs) and the desktop tracker.
+
+It holds no connection and runs no DDL, so it is cheap to construct; the schema is
+owned by migrations.py. OCR runs on the shared process pool (ocr_pool.py), LLM
+answers go through analysis_cache.py and client names through client_index.py.
+"""
+import json
+import os
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from .ocr_pool import get_ocr_pool, OCRBacklogFull
+from .analysis_cache import analysis_cache
+from .client_index import client_index
+
+
+load_dotenv()
+
+
+class ActivityAnalyzer:
+    def __init__(self):
+        self.api_key = os.getenv("GROQ_API_KEY")
+
+    def match_client(self, client_name: str) -> str:
+        if not client_name:
+            return "None"
+
+        # In-memory, case-folded index (client_index.py) instead of a query per response
+        try:
+            return client_index.match(client_name)
+        except Exception as e:
+            print("Error in match_client:", str(e))
+            return "None"
+
+    def extract_text_from_screen(self, screenshot_path: str, image_bytes: Optional[bytes] = None) -> str:
+        # OCR runs on the shared process pool (ocr_pool.py); pass image_bytes when the
+        # caller already holds the image so the file isn't read back from disk.
+        # OCRBacklogFull is re-raised so queued jobs can back off and retry.
+        try:
+            if image_bytes is None:
+                with open(screenshot_path, "rb") as f:
+                    image_bytes = f.read()
+            return get_ocr_pool().image_to_string(image_bytes)
+        except OCRBacklogFull:
+            raise
+        except Exception:
+            return ""
+
+    def analyze_content_with_gpt(self, window_info: Dict, extracted_text: str, manual_override: bool = False, strict: bool = False):
+        # strict=True raises on transport / HTTP errors instead of returning the fallback,
+        # so background jobs can retry them
+        try:
+            # ♻️ Same app / window / screen text / prompt seen before → reuse the analysis
+            variant = "manual" if manual_override else "auto"
+            cached = analysis_cache.get(window_info.get('application', ''), window_info.get('window_title', ''), extracted_text, variant)
+            if cached is not None:
+                ai_analysis, ai_response = cached
+                ai_analysis["client_name"] = self.match_client(ai_analysis.get("client_name"))
+                return ai_analysis, ai_response
+
+            if manual_override:
+                # 🔥 For manual entries, only ask for AI-driven fields
+                prompt = f"""
+                You are an AI that analyzes user activity for productivity tracking.
+
+                Application: {window_info.get('application', '')}
+                Window Title: {window_info.get('window_title', '')}
+                Extracted Text: {extracted_text[:2000]}
+
+                Return ONLY a JSON object with the following keys:
+                - activity_type (string)
+                - productivity_level (integer from 1–10, where 1 = unproductive/idle, 10 = highly productive. 
+                  If the user is coding, designing, writing documents, attending meetings → score 7–10. 
+                  If browsing social media, YouTube, or unrelated apps → score 0–2. 
+                  If ambiguous but seems work-related (e.g., Chrome tab with project context) → default to 7.)
+                - category (string: Work, Communication, Research, Social, Idle/Leisure, etc.)
+
+                Example:
+                {{
+                    "activity_type": "coding",
+                    "productivity_level": 9,
+                    "category": "Work"
+                }}
+                """
+            
+            else:
+                prompt = f"""
+                You are an AI that analyzes user activity for productivity tracking.
+
+                Application: {window_info.get('application', '')}
+                Window Title: {window_info.get('window_title', '')}
+                Extracted Text: {extracted_text[:2000]}
+
+                Return ONLY a JSON object with the following keys:
+                - client_name (string)
+                - activity_type (string)
+                - productivity_level (integer from 1–10, where 1 = unproductive/idle, 10 = highly productive. 
+                  If the user is coding, designing, writing documents, attending meetings → score 7–10. 
+                  If browsing social media, YouTube, or unrelated apps → score 0–2. 
+                  If ambiguous but seems work-related (e.g., Chrome tab with project context) → default to 7.)
+                - description (string)
+                - project_or_task (string)
+                - category (string: Work, Communication, Research, Social, Idle/Leisure, etc.)
+
+                Example:
+                {{
+                    "client_name": "Acme Corp",
+                    "activity_type": "coding",
+                    "productivity_level": 9,
+                    "description": "User is writing Python code in VSCode",
+                    "project_or_task": "Backend API development",
+                    "category": "Work"
+                }}
+
+                Return only ONE JSON object with fields: client_name, activity_type, productivity_level, description, project_or_task, category.
+                Do not return an array or multiple objects.
+                """
+
+            import requests  # first LLM call pays for it, not API startup
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+            data = {
+                "model": "llama-3.3-70b-versatile",
+                "messages": [
+                    {"role": "system", "content": "You analyze workplace activities and must always return strict JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                "max_tokens": 300,
+                "temperature": 0.2  # lower → more consistent JSON
+            }
+
+            resp = requests.post(
+                "https://api.groq.com/openai/v1/chat/completions",
+                headers=headers,
+                json=data,
+                timeout=30
+            )
+
+            print("##########################################")
+            # print("Status:", resp.status_code)
+            # print("Response JSON:", resp.json())
+            print(resp.status_code)
+            ai_response = resp.json()["choices"][0]["message"]["content"]
+            print(ai_response)
+
+            if resp.status_code == 200:
+                try:
+                    import re
+                    # Clean up code fences before parsing JSON
+                    clean_response = ai_response.strip()
+                    # Remove ```json ... ``` or ``` ... ```
+                    if clean_response.startswith("```"):
+                        clean_response = re.sub(r"^```(json)?", "", clean_response.strip(), flags=re.IGNORECASE).strip()
+                        clean_response = re.sub(r"```$", "", clean_response).strip()
+
+                    # ✅ Use AI JSON directly
+                    ai_analysis = json.loads(clean_response)
+                    # 🔥 If it's a list, take the first element
+                    if isinstance(ai_analysis, list) and len(ai_analysis) > 0:
+                        ai_analysis = ai_analysis[0]
+                    if isinstance(ai_analysis, dict):
+                        analysis_cache.put(window_info.get('application', ''), window_info.get('window_title', ''), extracted_text, variant, ai_analysis, ai_response)
+                    # ✅ Validate client name
+                    ai_analysis["client_name"] = self.match_client(ai_analysis.get("client_name"))
+                    return ai_analysis, ai_response
+                except Exception as e:
+                    print("LLM Exception1:", str(e))
+                    # If LLM didn’t return proper JSON, fallback
+                    return self.get_fallback_analysis(window_info), ai_response
+            
+            print("LLM Error:", resp.status_code, resp.text)
+            if strict:
+                raise RuntimeError(f"LLM returned HTTP {resp.status_code}")
+            return self.get_fallback_analysis(window_info), ai_response
+
+        except Exception as e:
+            print("LLM Exception2:", str(e))
+            if strict:
+                raise
+            return self.get_fallback_analysis(window_info), "Some Exception"
+
+
+    def get_fallback_analysis(self, window_info: Dict) -> Dict:
+        app = (window_info['application'] or "").lower()
+        if "word" in app or "excel" in app or 'teams' in app:
+            return {"client_name": "None", "activity_type": "document_editing", "productivity_level": 8, "description": f"Working with {app}", "project_or_task": "Unknown", "category": "Work"}
+        return {"client_name": "None", "activity_type": "general_work", "productivity_level": 7, "description": f"Working with {app}", "project_or_task": "Unknown", "category": "Work"}
+
+
+analyzer = ActivityAnalyzer()
@@ -0,0 +1,103 @@
+# bench_concurrency.py
+"""
+Concurrency check for one API process: fire --concurrency simultaneous dashboard GETs
+and screenshot uploads at the app in-process (ASGI, lifespan included) and report
+latency, errors and the peak thread count.
+
+Runs against DATABASE_URL as the seeded admin and drives the app through httpx, which
+comes with the dev dependency group (`uv sync` installs it; `pip install httpx` otherwise).
+Compare the two data-access paths:
+
+    python -m backend.benchmarks.bench_concurrency --backend async    [--concurrency 300] [--rounds 3]
+    python -m backend.benchmarks.bench_concurrency --backend threaded
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import threading
+import time
+from datetime import datetime
+
+
+def _png() -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (40, 90, 160)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+async def _run(args):
+    import httpx
+    from ..api_server import app
+
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    dashboard = [f"/api/activities?date={today}", "/api/clients", f"/api/clients-summary?date={today}",
+                 f"/api/admin/overview?date={today}"]
+    image = _png()
+    peak_threads = threading.active_count()
+    sampling = True
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while sampling:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.005)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            r = await client.post("/api/login", json={"username": args.email, "password": args.password})
+            r.raise_for_status()
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+            async def one(i: int):
+                started = time.perf_counter()
+                if args.upload_every and i % args.upload_every == 0:
+                    r = await client.post(
+                        "/api/upload-screenshot", headers=headers,
+                        files={"screenshot": ("bench.png", image, "image/png")},
+                        data={"application": "bench", "window_title": f"bench {i % 7}", "timestamp": f"{time.time()}"},
+                    )
+                else:
+                    r = await client.get(dashboard[i % len(dashboard)], headers=headers)
+                return time.perf_counter() - started, r.status_code
+
+            sampler = asyncio.create_task(sample_threads())
+            results = []
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                results += await asyncio.gather(*(one(i) for i in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            sampling = False
+            await sampler
+
+    latencies = sorted(t for t, _ in results)
+    codes = {}
+    for _, code in results:
+        codes[code] = codes.get(code, 0) + 1
+    print(f"{len(results)} requests, {args.concurrency} concurrent, backend={args.backend}: "
+          f"{len(results) / elapsed:.0f} req/s")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.0f} ms, "
+          f"p95 {latencies[int(0.95 * (len(latencies) - 1))] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms")
+    print(f"  status codes {codes}, peak threads {peak_threads}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent dashboard / upload load against one API process")
+    parser.add_argument("--backend", choices=("async", "threaded"), default="async")
+    parser.add_argument("--concurrency", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--upload-every", type=int, default=5, help="every Nth request is an upload (0: none)")
+    parser.add_argument("--email", default="admin@example.com")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args(argv)
+
+    # read by database.py at import time
+    os.environ["ASYNC_DB"] = "1" if args.backend == "async" else "0"
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench_serialization.py
+"""
+Micro-benchmark: legacy per-endpoint normalization + FastAPI's default encoding
+vs. the shared ActivitySerializer + FastJSONResponse.
+
+    python -m backend.benchmarks.bench_serialization [--rows 5000] [--repeat 5]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from ..activity_fields import ACTIVITIES_COLUMNS
+from ..serializers import FastJSONResponse, activity_serializer, orjson
+
+
+def make_rows(n: int):
+    start = datetime(2025, 9, 15, 9, 0, 0)
+    apps = ["Code", "OUTLOOK", "chrome", "Teams", "EXCEL"]
+    rows = []
+    for i in range(n):
+        s = start + timedelta(seconds=37 * i)
+        analysis = {
+            "client_name": random.choice(["Acme Corp", "None", "Globex"]),
+            "activity_type": "coding",
+            "productivity_level": random.randint(1, 10),
+            "description": "User is writing Python code in VSCode " * 3,
+            "project_or_task": "Backend API development",
+            "category": "Work",
+        }
+        rows.append((
+            i, 1, s, s + timedelta(seconds=30), random.choice(apps), f"file_{i}.py - project - Visual Studio Code",
+            f"screenshots/{i}.png", analysis, analysis["client_name"], "Work", random.randint(1, 10),
+            Decimal("0.5") * (i % 7), "Completed", "Automated Entry",
+        ))
+    return rows
+
+
+def legacy(rows):
+    # The normalization loop each endpoint used to carry, then FastAPI's default path
+    results = []
+    for r in rows:
+        rec = dict(zip(ACTIVITIES_COLUMNS, r))
+        if rec["ai_analysis"] is None:
+            rec["ai_analysis"] = {}
+        elif isinstance(rec["ai_analysis"], str):
+            try:
+                rec["ai_analysis"] = json.loads(rec["ai_analysis"])
+            except Exception:
+                rec["ai_analysis"] = {}
+        if isinstance(rec["client_identified"], dict):
+            rec["client_identified"] = rec["client_identified"].get("client_name", "None")
+        try:
+            rec["productivity_score"] = int(rec["productivity_score"])
+        except Exception:
+            rec["productivity_score"] = 5
+        if rec["end_time"] is not None:
+            rec["duration_minutes"] = round(float(rec["duration_minutes"]), 2)
+        else:
+            rec["duration_minutes"] = None
+        results.append(rec)
+    return JSONResponse(jsonable_encoder(results)).body
+
+
+def fast(rows):
+    return FastJSONResponse(activity_serializer(ACTIVITIES_COLUMNS).rows(rows)).body
+
+
+def best_of(fn, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rows = make_rows(args.rows)
+    assert json.loads(legacy(rows[:50])) == json.loads(fast(rows[:50])), "outputs differ"
+
+    old = best_of(legacy, rows, args.repeat)
+    new = best_of(fast, rows, args.repeat)
+    print(f"rows={args.rows} orjson={'yes' if orjson else 'no'}")
+    print(f"legacy loop + jsonable_encoder : {old * 1000:8.1f} ms")
+    print(f"ActivitySerializer + FastJSON  : {new * 1000:8.1f} ms")
+    print(f"speed-up                       : {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
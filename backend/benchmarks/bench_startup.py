@@ -0,0 +1,97 @@
+# bench_startup.py
+"""
+Cold-import budget for the API: time `import backend.api_server` in fresh interpreters,
+check the OCR / imaging stack stayed unloaded, and show the slowest imports.
+
+Importing must not need the database — startup work runs in the lifespan hook — so the
+children get an unreachable DATABASE_URL. Exits 1 when the median import time exceeds the
+budget or a lazily-loaded module was imported. tests/test_startup.py runs the same checks
+under pytest; this script adds the slowest-imports breakdown for digging into a regression.
+
+    python -m backend.benchmarks.bench_startup [--runs 5] [--budget 1.5] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.5"))   # seconds, median of --runs
+
+# Loaded on first use (frame hashing, OCR workers, the desktop tracker, LLM calls)
+LAZY_MODULES = ("numpy", "PIL", "pytesseract", "psutil", "mss", "requests")
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import backend.api_server
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": sorted(m for m in %r if m in sys.modules)}))
+""" % (LAZY_MODULES,)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _child_env():
+    env = dict(os.environ)
+    env["DATABASE_URL"] = "postgresql://startup-bench@127.0.0.1:1/unreachable"
+    return env
+
+
+def measure_once():
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=REPO_ROOT, env=_child_env(),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int):
+    """(cumulative µs, module) for the slowest imports, from -X importtime."""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.api_server"],
+        cwd=REPO_ROOT, env=_child_env(), capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of backend.api_server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=STARTUP_IMPORT_BUDGET)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    results = [measure_once() for _ in range(args.runs)]
+    seconds = [r["seconds"] for r in results]
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    median = statistics.median(seconds)
+
+    print(f"import backend.api_server: median {median * 1000:.0f} ms, "
+          f"min {min(seconds) * 1000:.0f} ms, max {max(seconds) * 1000:.0f} ms over {args.runs} run(s)")
+    if args.top:
+        print("slowest imports (cumulative):")
+        for micros, name in slowest_imports(args.top):
+            print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: imported at startup but should load lazily: {', '.join(loaded)}")
+        failed = True
+    if median > args.budget:
+        print(f"FAIL: median import time {median:.3f}s is over the {args.budget:.3f}s budget")
+        failed = True
+    if not failed:
+        print(f"OK: within the {args.budget:.3f}s budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
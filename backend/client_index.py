@@ -0,0 +1,137 @@
+# client_index.py
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from .db_pool import get_connection
+
+
+load_dotenv()
+
+# How often (seconds) a worker asks Postgres whether another worker changed the client list
+CLIENT_INDEX_CHECK_INTERVAL = float(os.getenv("CLIENT_INDEX_CHECK_INTERVAL", "5"))
+
+
+def ensure_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("INSERT INTO cache_versions (name) VALUES ('clients') ON CONFLICT (name) DO NOTHING")
+
+
+async def bump_version(tx, name: str = "clients") -> int:
+    """Increment a shared cache version inside the caller's transaction (database.transaction())."""
+    row = await tx.fetch_one("""
+        INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+        ON CONFLICT (name) DO UPDATE
+        SET version = cache_versions.version + 1, updated_at = NOW()
+        RETURNING version
+    """, (name,))
+    return row[0]
+
+
+class ClientIndex:
+    """
+    Process-wide, case-folded map of client names used by match_client.
+
+    Loaded once and then refreshed only when the `clients` row in cache_versions
+    moves — bumped by every client write — so lookups are a dict access and other
+    API workers pick up changes within CLIENT_INDEX_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, check_interval: float = CLIENT_INDEX_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._names: Dict[str, str] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+        # metrics
+        self._lookups = 0
+        self._reloads = 0
+
+    @staticmethod
+    def _fetch(known_version: Optional[int]):
+        """
+        (version, names) from Postgres; names is None when the version still equals
+        `known_version`. Runs on its own pooled connection without touching self.
+        """
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT version FROM cache_versions WHERE name = 'clients'")
+            row = cur.fetchone()
+            version = row[0] if row else 0
+            names = None
+            if version != known_version:
+                cur.execute("SELECT name FROM clients")
+                names = {r[0].casefold(): r[0] for r in cur.fetchall() if r[0]}
+            conn.commit()
+            return version, names
+        finally:
+            cur.close()
+            conn.close()
+
+    def _refresh(self, force: bool = False):
+        # The lock only guards the in-memory swap; the DB round trip runs outside it so
+        # a slow or stalled Postgres doesn't serialise every lookup behind one query.
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._version is not None and now - self._checked_at < self.check_interval:
+                return
+            known = None if force else self._version
+            previous_check = self._checked_at
+            self._checked_at = now  # other callers keep serving the current copy meanwhile
+        try:
+            version, names = self._fetch(known)
+        except Exception:
+            with self._lock:
+                if self._checked_at == now:
+                    self._checked_at = previous_check  # retry on the next lookup
+            raise
+        with self._lock:
+            # a slower concurrent refresh may land after a newer one; versions only grow
+            if names is not None and (force or self._version is None or version >= self._version):
+                self._names = names
+                self._version = version
+                self._reloads += 1
+
+    def match(self, client_name: Optional[str]) -> str:
+        """Canonical client name for `client_name` (case-insensitive), or "None"."""
+        if not client_name or not isinstance(client_name, str):
+            return "None"
+        with self._lock:
+            self._lookups += 1
+        try:
+            self._refresh()
+        except Exception as e:
+            # keep serving the last good copy if Postgres hiccups
+            print("Client index refresh failed:", str(e))
+        return self._names.get(client_name.strip().casefold(), "None")
+
+    def invalidate(self):
+        """Reload right away — call after committing a client write in this process."""
+        try:
+            self._refresh(force=True)
+        except Exception as e:
+            print("Client index reload failed:", str(e))
+            with self._lock:
+                self._version = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "clients": len(self._names),
+                "version": self._version,
+                "lookups": self._lookups,
+                "reloads": self._reloads,
+            }
+
+
+client_index = ClientIndex()
@@ -0,0 +1,295 @@
+# database.py
+"""
+Async data access for the API endpoints.
+
+Endpoints use `database`, a small interface: fetch_one / fetch_all / execute for single
+statements, transaction() for multi-statement writes, stream() for large result sets and
+run_sync() for helpers written against a psycopg2 cursor. Rows are plain tuples and the
+SQL is the usual %s-placeholder SQL, whichever backend runs it:
+
+- psycopg 3 AsyncConnectionPool (default). Queries are awaited on the event loop, so one
+  uvicorn worker can have hundreds of requests in flight: at most ASYNC_DB_POOL_MAX_SIZE
+  of them hold a connection and the rest wait for one without holding a thread.
+- the psycopg2 pool from db_pool.py, each call on the threadpool. Used with ASYNC_DB=0,
+  when psycopg isn't installed, or when the event loop can't run it (Windows Proactor).
+
+Single statements run in autocommit — a statement is atomic on its own, so there are no
+BEGIN / COMMIT round trips. Background threads (analysis workers, session reaper,
+migrations) keep using db_pool directly.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from .db_pool import get_connection, DATABASE_URL, DB_POOL_TIMEOUT, DB_POOL_MAX_LIFETIME
+from .serializers import orjson
+
+
+load_dotenv()
+
+# ====== Async pool config ======
+ASYNC_DB = os.getenv("ASYNC_DB", "1") == "1"                                   # 0 → psycopg2 on the threadpool
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", "2"))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "20"))
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv("ASYNC_DB_POOL_TIMEOUT", str(DB_POOL_TIMEOUT)))   # wait for a connection (s)
+ASYNC_DB_POOL_MAX_IDLE = float(os.getenv("ASYNC_DB_POOL_MAX_IDLE", "600"))     # close surplus connections idle this long
+STREAM_FETCH_SIZE = 2000   # rows per round trip from a server-side cursor
+
+_ONE, _ALL, _COUNT = "one", "all", "count"
+
+
+class IntegrityError(Exception):
+    """A constraint violation (unique, foreign key, check) from either backend."""
+
+
+class _Queries:
+    """fetch_one / fetch_all / execute on top of _run(sql, params, mode)."""
+
+    async def _run(self, sql: str, params, mode: str):
+        raise NotImplementedError
+
+    async def fetch_one(self, sql: str, params=None) -> Optional[tuple]:
+        return await self._run(sql, params, _ONE)
+
+    async def fetch_all(self, sql: str, params=None) -> List[tuple]:
+        return await self._run(sql, params, _ALL)
+
+    async def execute(self, sql: str, params=None) -> int:
+        """Run a statement for its effect; returns the affected row count."""
+        return await self._run(sql, params, _COUNT)
+
+
+# ====== psycopg 3 (async) ======
+async def _configure(conn):
+    # jsonb columns (ai_analysis, event rows) decode with orjson when it is installed
+    if orjson is not None:
+        from psycopg.types.json import set_json_loads
+        set_json_loads(orjson.loads, conn)
+
+
+async def _execute_async(conn, sql, params, mode):
+    import psycopg
+    try:
+        cur = await conn.execute(sql, params)
+    except psycopg.IntegrityError as e:
+        raise IntegrityError(str(e)) from e
+    if mode == _ONE:
+        return await cur.fetchone()
+    if mode == _ALL:
+        return await cur.fetchall()
+    return cur.rowcount
+
+
+class _AsyncTransaction(_Queries):
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def _run(self, sql, params, mode):
+        return await _execute_async(self._conn, sql, params, mode)
+
+
+class _AsyncBackend:
+    name = "psycopg-async"
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn or DATABASE_URL
+        self._pool = None
+
+    async def open(self):
+        # Imported here: the threadpool fallback must work without psycopg installed
+        from psycopg_pool import AsyncConnectionPool
+        if sys.platform == "win32" and isinstance(asyncio.get_running_loop(), asyncio.ProactorEventLoop):
+            raise RuntimeError("psycopg needs a selector event loop on Windows")
+        self._pool = AsyncConnectionPool(
+            self.dsn,
+            min_size=min(ASYNC_DB_POOL_MIN_SIZE, ASYNC_DB_POOL_MAX_SIZE),
+            max_size=ASYNC_DB_POOL_MAX_SIZE,
+            timeout=ASYNC_DB_POOL_TIMEOUT,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            max_idle=ASYNC_DB_POOL_MAX_IDLE,
+            kwargs={"autocommit": True},
+            configure=_configure,
+            check=AsyncConnectionPool.check_connection,
+            name="api",
+            open=False,
+        )
+        await self._pool.open()
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def run(self, sql, params, mode):
+        async with self._pool.connection() as conn:
+            return await _execute_async(conn, sql, params, mode)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self._pool.connection() as conn:
+            async with conn.transaction():
+                yield _AsyncTransaction(conn)
+
+    async def stream(self, sql, params, batch_size):
+        async with self._pool.connection() as conn:
+            # server-side cursors live inside a transaction
+            async with conn.transaction():
+                async with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                    await cur.execute(sql, params)
+                    while True:
+                        rows = await cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield rows
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **(self._pool.get_stats() if self._pool else {})}
+
+
+# ====== psycopg2 on the threadpool (fallback) ======
+def _execute_sync(conn, sql, params, mode):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        if mode == _ONE:
+            return cur.fetchone()
+        if mode == _ALL:
+            return cur.fetchall()
+        return cur.rowcount
+    except psycopg2.IntegrityError as e:
+        raise IntegrityError(str(e)) from e
+    finally:
+        cur.close()
+
+
+def _statement_sync(sql, params, mode):
+    conn = get_connection()
+    conn.raw.autocommit = True
+    try:
+        return _execute_sync(conn, sql, params, mode)
+    finally:
+        if not conn.raw.closed:
+            conn.raw.autocommit = False
+        conn.close()
+
+
+def _with_cursor(fn: Callable, *args):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        result = fn(cur, *args)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+class _ThreadedTransaction(_Queries):
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def _run(self, sql, params, mode):
+        return await run_in_threadpool(_execute_sync, self._conn, sql, params, mode)
+
+
+class _ThreadedBackend:
+    name = "psycopg2-threadpool"
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def run(self, sql, params, mode):
+        return await run_in_threadpool(_statement_sync, sql, params, mode)
+
+    @asynccontextmanager
+    async def transaction(self):
+        conn = await run_in_threadpool(get_connection)
+        try:
+            yield _ThreadedTransaction(conn)
+            await run_in_threadpool(conn.commit)
+        finally:
+            # an uncommitted transaction is rolled back when the pool takes the connection back
+            conn.close()
+
+    async def stream(self, sql, params, batch_size):
+        conn = await run_in_threadpool(get_connection)
+        try:
+            cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+            await run_in_threadpool(cur.execute, sql, params)
+            while True:
+                rows = await run_in_threadpool(cur.fetchmany, batch_size)
+                if not rows:
+                    break
+                yield rows
+            cur.close()
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {"backend": self.name}   # the pool itself is reported as db_pool
+
+
+# ====== Shared instance ======
+class Database(_Queries):
+    """
+    The data-access interface endpoints use. open() (run by the API lifespan) picks the
+    backend; until then — scripts, or ASYNC_DB=0 — calls go through the threadpool.
+    """
+
+    def __init__(self):
+        self._backend = _ThreadedBackend()
+
+    @property
+    def backend(self) -> str:
+        return self._backend.name
+
+    async def open(self):
+        if not ASYNC_DB or isinstance(self._backend, _AsyncBackend):
+            return
+        backend = _AsyncBackend()
+        try:
+            await backend.open()
+        except (ImportError, RuntimeError) as e:
+            print("Async database unavailable, using psycopg2 on the threadpool:", str(e))
+            return
+        self._backend = backend
+        print(f"Async database pool open (max {ASYNC_DB_POOL_MAX_SIZE} connections)")
+
+    async def close(self):
+        backend, self._backend = self._backend, _ThreadedBackend()
+        await backend.close()
+
+    async def _run(self, sql, params, mode):
+        return await self._backend.run(sql, params, mode)
+
+    def transaction(self):
+        """`async with database.transaction() as tx:` — commits on success, rolls back on error."""
+        return self._backend.transaction()
+
+    def stream(self, sql: str, params=None, batch_size: int = STREAM_FETCH_SIZE) -> AsyncIterator[List[tuple]]:
+        """Batches of rows from a server-side cursor; the connection is held until iteration ends."""
+        return self._backend.stream(sql, params, batch_size)
+
+    async def run_sync(self, fn: Callable, *args):
+        """fn(cur, *args) with a psycopg2 cursor on the threadpool, committed — for cursor-based helpers."""
+        return await run_in_threadpool(_with_cursor, fn, *args)
+
+    def stats(self) -> dict:
+        return self._backend.stats()
+
+
+database = Database()
@@ -0,0 +1,52 @@
+# db_indexes.py
+from typing import Dict, List
+
+# (index name, table, CREATE statement) — every dashboard query filters on user + time range
+REQUIRED_INDEXES = [
+    (
+        "idx_activities_user_start",
+        "activities",
+        "CREATE INDEX IF NOT EXISTS idx_activities_user_start ON activities (user_id, start_time)",
+    ),
+    (
+        "idx_screenshots_user_taken",
+        "screenshots",
+        "CREATE INDEX IF NOT EXISTS idx_screenshots_user_taken ON screenshots (user_id, taken_at)",
+    ),
+]
+
+
+def ensure_indexes(cur) -> List[Dict]:
+    """
+    Create the required indexes if missing and verify Postgres considers them usable.
+    An index left invalid by an interrupted build is rebuilt with REINDEX.
+    """
+    for _, _, ddl in REQUIRED_INDEXES:
+        cur.execute(ddl)
+    return check_indexes(cur, rebuild=True)
+
+
+def check_indexes(cur, rebuild: bool = False) -> List[Dict]:
+    """Catalog-only validity report for the required indexes (no DDL unless `rebuild`)."""
+    report = []
+    for name, table, _ in REQUIRED_INDEXES:
+        cur.execute("""
+            SELECT i.indisvalid AND i.indisready
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s
+        """, (name,))
+        row = cur.fetchone()
+        status = "ok"
+        if row is None:
+            status = "missing"
+        elif not row[0]:
+            status = "invalid"
+            if rebuild:
+                print(f"⚠️ Index {name} on {table} is invalid — rebuilding")
+                cur.execute(f"REINDEX INDEX {name}")
+                status = "rebuilt"
+        if status == "missing":
+            print(f"⚠️ Index {name} on {table} could not be verified")
+        report.append({"index": name, "table": table, "status": status})
+    return report
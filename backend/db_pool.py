@@ -0,0 +1,323 @@
+# db_pool.py
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# ====== Pool config ======
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))                  # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))      # recycle connections older than this
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))  # ping connections idle longer than this
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """
+    Thin proxy around a psycopg2 connection checked out of a ConnectionPool.
+
+    Behaves like the raw connection, except close() hands it back to the pool
+    instead of tearing down the socket, so existing `conn = db() ... conn.close()`
+    code keeps working unchanged.
+    """
+
+    def __init__(self, pool: "ConnectionPool", entry: _PoolEntry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get("_entry")
+        if entry is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(entry.conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Commit / rollback like psycopg2, then release back to the pool
+        entry = self._entry
+        if entry is not None and not entry.conn.closed:
+            if exc_type is None:
+                entry.conn.commit()
+            else:
+                entry.conn.rollback()
+        self.close()
+
+    @property
+    def raw(self):
+        return self._entry.conn if self._entry else None
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry)
+
+    def discard(self):
+        """Drop the underlying connection instead of returning it (e.g. after a fatal error)."""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry, discard=True)
+
+    def __del__(self):
+        # Safety net for code paths that raise before calling close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe psycopg2 connection pool.
+
+    - at most `max_size` connections are open at any time; callers block up to
+      `timeout` seconds for a free one and get PoolTimeout after that
+    - connections idle longer than `healthcheck_idle` are pinged before reuse
+    - connections older than `max_lifetime` are closed and replaced on return
+    """
+
+    def __init__(self, dsn: Optional[str] = None, min_size: int = DB_POOL_MIN_SIZE,
+                 max_size: int = DB_POOL_MAX_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 max_lifetime: float = DB_POOL_MAX_LIFETIME,
+                 healthcheck_idle: float = DB_POOL_HEALTHCHECK_IDLE):
+        self.dsn = dsn or DATABASE_URL
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.healthcheck_idle = healthcheck_idle
+
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        # RLock: PooledConnection.__del__ may release while this thread already holds the lock
+        self._cond = threading.Condition(threading.RLock())
+
+        # metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_healthchecks = 0
+        self._hold_total = 0.0
+        self._in_use_since = {}
+
+    # ---- internals ----
+    def _connect(self) -> _PoolEntry:
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created += 1
+        return _PoolEntry(conn)
+
+    def _expired(self, entry: _PoolEntry, now: float) -> bool:
+        return self.max_lifetime > 0 and now - entry.created_at > self.max_lifetime
+
+    def _healthy(self, entry: _PoolEntry, now: float) -> bool:
+        conn = entry.conn
+        if conn.closed:
+            return False
+        if now - entry.last_used < self.healthcheck_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(entry: _PoolEntry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    # ---- public API ----
+    def getconn(self, timeout: Optional[float] = None) -> PooledConnection:
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            entry = None
+            reserve = False
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                while not self._idle and self._size >= self.max_size:
+                    waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"no database connection available after {timeout:.1f}s "
+                            f"(pool size {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+                    reserve = True
+
+            # Connect / health-check outside the lock
+            if reserve:
+                try:
+                    entry = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                expired = self._expired(entry, now)
+                if expired or not self._healthy(entry, now):
+                    self._close_quietly(entry)
+                    with self._cond:
+                        if expired:
+                            self._recycled += 1
+                        else:
+                            self._failed_healthchecks += 1
+                        self._size -= 1
+                        self._cond.notify()
+                    continue
+
+            now = time.monotonic()
+            wait = now - started
+            with self._cond:
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._in_use_since[id(entry)] = now
+            return PooledConnection(self, entry)
+
+    def _release(self, entry: _PoolEntry, discard: bool = False):
+        now = time.monotonic()
+        conn = entry.conn
+        if not discard and not conn.closed:
+            try:
+                # never hand a connection with an open transaction to the next caller
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        recycled = False
+        if not discard and (conn.closed or self._expired(entry, now)):
+            recycled = not conn.closed
+            discard = True
+
+        with self._cond:
+            if recycled:
+                self._recycled += 1
+            since = self._in_use_since.pop(id(entry), None)
+            if since is not None:
+                self._hold_total += now - since
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if discard or self._closed:
+            self._close_quietly(entry)
+
+    def prefill(self):
+        """Open `min_size` connections up front so the first requests don't pay the handshake."""
+        held = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size:
+                        break
+                held.append(self.getconn())
+        finally:
+            for conn in held:
+                conn.close()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry)
+
+    def stats(self) -> dict:
+        with self._cond:
+            in_use = self._size - len(self._idle)
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "checkouts": self._checkouts,
+                "checkouts_waited": self._waits,
+                "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+                "hold_avg_ms": round(self._hold_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_recycled": self._recycled,
+                "failed_healthchecks": self._failed_healthchecks,
+            }
+
+
+# ====== Shared process-wide pool ======
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_URL)
+    return _pool
+
+
+def get_connection(timeout: Optional[float] = None) -> PooledConnection:
+    """Check a connection out of the shared pool. Call .close() to give it back."""
+    return get_pool().getconn(timeout)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
@@ -0,0 +1,179 @@
+# etags.py
+"""
+Change versions and conditional-GET helpers for the dashboard endpoints.
+
+user_day_versions holds one counter per (user, day). Triggers on activities and
+screenshots bump it on every insert / update / delete — whichever code path did
+the write — so an endpoint can answer "did anything for this user on this day
+change?" with a single primary-key lookup before running its real query.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import Response
+
+
+load_dotenv()
+
+# A day counts as settled this long after it ended (covers timezone skew and late analysis jobs)
+ETAG_SETTLE_HOURS = float(os.getenv("ETAG_SETTLE_HOURS", "24"))
+# Browser cache lifetime for settled days; still revalidated with If-None-Match afterwards
+ETAG_PAST_DAY_MAX_AGE = int(os.getenv("ETAG_PAST_DAY_MAX_AGE", "86400"))
+
+
+def ensure_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_day_versions (
+            user_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_id, day)
+        )
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION bump_user_day_version(p_user_id INTEGER, p_day DATE)
+        RETURNS void LANGUAGE sql AS $$
+            INSERT INTO user_day_versions AS v (user_id, day, version)
+            SELECT p_user_id, p_day, 1
+            WHERE p_user_id IS NOT NULL AND p_day IS NOT NULL
+            ON CONFLICT (user_id, day) DO UPDATE
+            SET version = v.version + 1, updated_at = NOW()
+        $$
+    """)
+    # activities are keyed by start_time, screenshots by taken_at
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION user_day_version_trigger()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            new_day DATE;
+            old_day DATE;
+        BEGIN
+            IF TG_TABLE_NAME = 'screenshots' THEN
+                IF TG_OP <> 'DELETE' THEN new_day := NEW.taken_at::date; END IF;
+                IF TG_OP <> 'INSERT' THEN old_day := OLD.taken_at::date; END IF;
+            ELSE
+                IF TG_OP <> 'DELETE' THEN new_day := NEW.start_time::date; END IF;
+                IF TG_OP <> 'INSERT' THEN old_day := OLD.start_time::date; END IF;
+            END IF;
+
+            IF TG_OP <> 'DELETE' THEN
+                PERFORM bump_user_day_version(NEW.user_id, new_day);
+            END IF;
+            IF TG_OP = 'DELETE'
+               OR OLD.user_id IS DISTINCT FROM NEW.user_id
+               OR old_day IS DISTINCT FROM new_day THEN
+                PERFORM bump_user_day_version(OLD.user_id, old_day);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    # Only when missing: CREATE TRIGGER locks the table against writes, and this runs on every startup
+    for table in ("activities", "screenshots"):
+        cur.execute(
+            "SELECT 1 FROM pg_trigger WHERE tgrelid = %s::regclass AND tgname = %s",
+            (table, f"{table}_user_day_version")
+        )
+        if cur.fetchone():
+            continue
+        cur.execute(f"""
+            CREATE TRIGGER {table}_user_day_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION user_day_version_trigger()
+        """)
+
+
+def ensure_partition_triggers(cur):
+    """Migration 10: the day-version triggers on the partitioned activities / screenshots."""
+    # On a partitioned table TG_TABLE_NAME is the partition, so each trigger passes its table
+    # as an argument; triggers created before migration 10 have none
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION user_day_version_trigger()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            new_day DATE;
+            old_day DATE;
+        BEGIN
+            IF COALESCE(TG_ARGV[0], TG_TABLE_NAME) = 'screenshots' THEN
+                IF TG_OP <> 'DELETE' THEN new_day := NEW.taken_at::date; END IF;
+                IF TG_OP <> 'INSERT' THEN old_day := OLD.taken_at::date; END IF;
+            ELSE
+                IF TG_OP <> 'DELETE' THEN new_day := NEW.start_time::date; END IF;
+                IF TG_OP <> 'INSERT' THEN old_day := OLD.start_time::date; END IF;
+            END IF;
+
+            IF TG_OP <> 'DELETE' THEN
+                PERFORM bump_user_day_version(NEW.user_id, new_day);
+            END IF;
+            IF TG_OP = 'DELETE'
+               OR OLD.user_id IS DISTINCT FROM NEW.user_id
+               OR old_day IS DISTINCT FROM new_day THEN
+                PERFORM bump_user_day_version(OLD.user_id, old_day);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    # Replacing the tables dropped their triggers; these are cloned onto every partition
+    for table in ("activities", "screenshots"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {table}_user_day_version ON {table}")
+        cur.execute(f"""
+            CREATE TRIGGER {table}_user_day_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION user_day_version_trigger('{table}')
+        """)
+
+
+async def day_version(db, user_id: int, day) -> int:
+    """Current change counter for (user_id, day); 0 if nothing was ever written. `db`: see database.py."""
+    row = await db.fetch_one("SELECT version FROM user_day_versions WHERE user_id = %s AND day = %s", (user_id, day))
+    return row[0] if row else 0
+
+
+async def cache_version(db, name: str) -> int:
+    """Current value of a cache_versions row (see client_index.py)."""
+    row = await db.fetch_one("SELECT version FROM cache_versions WHERE name = %s", (name,))
+    return row[0] if row else 0
+
+
+def make_etag(*parts) -> str:
+    # Weak: the same representation may go out gzip'd, brotli'd or plain
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    ours = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == ours:
+            return True
+    return False
+
+
+def day_cache_headers(etag: str, day_end: datetime) -> Dict[str, str]:
+    """
+    ETag plus Cache-Control for data about one day. Settled days can be served from
+    the browser cache outright; today (and yesterday, until it settles) must revalidate,
+    which is a 304 unless something was written.
+    """
+    if day_end <= datetime.now() - timedelta(hours=ETAG_SETTLE_HOURS):
+        cache_control = f"private, max-age={ETAG_PAST_DAY_MAX_AGE}"
+    else:
+        cache_control = "private, no-cache"
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
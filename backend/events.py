@@ -0,0 +1,253 @@
+# events.py
+"""
+Live activity events for the dashboards, served as Server-Sent Events from /api/events.
+
+Writers call publish_activity() after they commit — publish_activity_async() from async
+endpoints. Subscribers are asyncio queues on the event loop; dispatch hands events over
+with call_soon_threadsafe, so threadpool code and analysis workers can publish directly.
+
+With EVENTS_PG_NOTIFY=1 events travel through Postgres NOTIFY instead, and every API
+worker runs a LISTEN thread that feeds its local broker — a browser connected to one
+worker then also sees uploads handled by another.
+"""
+import asyncio
+import itertools
+import json
+import os
+import select
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+from .db_pool import get_connection, DATABASE_URL
+from .serializers import dumps
+from .database import database
+
+
+load_dotenv()
+
+# ====== Event config ======
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))     # per subscriber; oldest events dropped when full
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))      # seconds between keep-alive comments
+EVENTS_PG_NOTIFY = os.getenv("EVENTS_PG_NOTIFY", "0") == "1"       # fan out across workers via LISTEN/NOTIFY
+EVENTS_CHANNEL = "activity_events"
+NOTIFY_MAX_PAYLOAD = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+
+ACTIVITY_EVENT_TYPES = ("activity.created", "activity.updated", "activity.closed")
+# kept when an event is too large for NOTIFY; clients refetch the rest if they need it
+SLIM_ACTIVITY_FIELDS = ("id", "user_id", "start_time", "end_time", "application",
+                        "client_identified", "category", "productivity_score",
+                        "status", "entry_type", "duration_minutes")
+
+
+class Subscription:
+    def __init__(self, sub_id: int, user_id: Optional[int], loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.id = sub_id
+        self.user_id = user_id  # None → every user's events (admins)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+
+class EventBroker:
+    """In-process fan-out of serialized events to SSE subscribers."""
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subs: Dict[int, Subscription] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        # metrics
+        self._dispatched = 0
+        self._delivered = 0
+        self._dropped = 0
+
+    def subscribe(self, user_id: Optional[int]) -> Subscription:
+        """Register a subscriber; call from the event loop that will read its queue."""
+        sub = Subscription(next(self._ids), user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subs[sub.id] = sub
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subs.pop(sub.id, None)
+
+    def dispatch(self, event_type: str, user_id: int, message: str):
+        """Hand an event to every matching local subscriber. Safe from any thread."""
+        with self._lock:
+            self._dispatched += 1
+            targets = [s for s in self._subs.values() if s.user_id is None or s.user_id == user_id]
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(self._offer, sub, event_type, message)
+            except RuntimeError:
+                # loop already closed — the client is gone
+                self.unsubscribe(sub)
+
+    def _offer(self, sub: Subscription, event_type: str, message: str):
+        # Runs on the subscriber's loop. A slow client loses its oldest events, not our memory.
+        dropped = 0
+        if sub.queue.full():
+            sub.queue.get_nowait()
+            dropped = 1
+        sub.queue.put_nowait((event_type, message))
+        with self._lock:
+            self._delivered += 1
+            self._dropped += dropped
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subs),
+                "dispatched": self._dispatched,
+                "delivered": self._delivered,
+                "dropped": self._dropped,
+                "pg_notify": EVENTS_PG_NOTIFY,
+                "listener_connected": notify_listener.connected,
+            }
+
+
+class NotifyListener:
+    """LISTENs on EVENTS_CHANNEL over a dedicated connection and feeds the local broker."""
+
+    def __init__(self, broker: EventBroker):
+        self.broker = broker
+        self.connected = False
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="events-listener", daemon=True)
+        self._thread.start()
+        print(f"Listening for activity events on '{EVENTS_CHANNEL}'")
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                # Not pooled: this connection sits in LISTEN for the life of the worker
+                conn = psycopg2.connect(DATABASE_URL)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {EVENTS_CHANNEL}")
+                self.connected = True
+                while not self._stopping.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._deliver(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print("Event listener error, reconnecting:", str(e))
+                self._stopping.wait(2)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+
+    def _deliver(self, payload: str):
+        try:
+            event = json.loads(payload)
+            self.broker.dispatch(event["type"], event["user_id"], payload)
+        except Exception as e:
+            print("Bad activity event payload:", str(e))
+
+
+def _notify(message: str):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, message))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _message(event_type: str, activity: Dict) -> Tuple[Optional[int], str]:
+    # (user_id, JSON message); trimmed to SLIM_ACTIVITY_FIELDS when too large for NOTIFY
+    user_id = activity.get("user_id")
+    message = dumps({"type": event_type, "user_id": user_id, "activity": activity}).decode("utf-8")
+    if EVENTS_PG_NOTIFY and len(message.encode("utf-8")) > NOTIFY_MAX_PAYLOAD:
+        slim = {k: activity.get(k) for k in SLIM_ACTIVITY_FIELDS}
+        message = dumps({"type": event_type, "user_id": user_id, "activity": slim, "partial": True}).decode("utf-8")
+    return user_id, message
+
+
+def publish_activity(event_type: str, activity: Dict):
+    """
+    Publish an activity change (call after the write committed). `activity` is the
+    serialized row; it must carry user_id. Never raises — a lost live update only
+    means the dashboard catches up on its next refetch. Blocks on Postgres with
+    EVENTS_PG_NOTIFY=1: async endpoints use publish_activity_async().
+    """
+    try:
+        user_id, message = _message(event_type, activity)
+        if not EVENTS_PG_NOTIFY:
+            event_broker.dispatch(event_type, user_id, message)
+            return
+        _notify(message)
+    except Exception as e:
+        print(f"Failed to publish {event_type}:", str(e))
+
+
+def publish_activities(changes: List):
+    """publish_activity() for a list of (event_type, activity) pairs."""
+    for event_type, activity in changes:
+        publish_activity(event_type, activity)
+
+
+async def publish_activities_async(changes: List):
+    """publish_activities() for async endpoints: NOTIFY goes through the async database layer, in one statement."""
+    if not changes:
+        return
+    try:
+        messages = [(event_type, *_message(event_type, activity)) for event_type, activity in changes]
+        if not EVENTS_PG_NOTIFY:
+            for event_type, user_id, message in messages:
+                event_broker.dispatch(event_type, user_id, message)
+            return
+        await database.execute(
+            "SELECT pg_notify(%s, m) FROM unnest(%s::text[]) WITH ORDINALITY AS t(m, n) ORDER BY n",
+            (EVENTS_CHANNEL, [message for _, _, message in messages])
+        )
+    except Exception as e:
+        print(f"Failed to publish {', '.join(sorted({c[0] for c in changes}))}:", str(e))
+
+
+async def publish_activity_async(event_type: str, activity: Dict):
+    await publish_activities_async([(event_type, activity)])
+
+
+async def sse_stream(sub: Subscription, is_disconnected):
+    """
+    SSE frames for one subscriber: events as they arrive, a comment every
+    EVENTS_HEARTBEAT seconds so proxies keep the connection open.
+    """
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event_type, message = await asyncio.wait_for(sub.queue.get(), timeout=EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            yield f"event: {event_type}\ndata: {message}\n\n"
+    finally:
+        event_broker.unsubscribe(sub)
+
+
+event_broker = EventBroker()
+notify_listener = NotifyListener(event_broker)
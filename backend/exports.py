@@ -0,0 +1,80 @@
+# exports.py
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterator, Optional
+
+from .database import database
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+EXPORT_FETCH_SIZE = 2000   # rows per round trip from the server-side cursor
+EXPORT_FLUSH_ROWS = 500    # rows per chunk handed to the HTTP response
+
+EXPORT_COLUMNS = [
+    "id", "user_id", "user_email", "start_time", "end_time", "duration_minutes",
+    "application", "window_title", "client_identified", "project_or_task", "description",
+    "category", "productivity_score", "status", "entry_type",
+]
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+async def stream_activities(start: datetime, end: datetime, user_id: Optional[int], fmt: str) -> AsyncIterator[str]:
+    """
+    Yield activities in [start, end) as CSV or NDJSON chunks, oldest first.
+
+    Rows come from a server-side cursor (database.stream) EXPORT_FETCH_SIZE at a time —
+    memory stays flat no matter how large the range is. `user_id=None` exports every
+    user. The pooled connection is held until the generator finishes or the client
+    disconnects.
+    """
+    conditions = ["a.start_time >= %s", "a.start_time < %s"]
+    params = [start, end]
+    if user_id is not None:
+        conditions.insert(0, "a.user_id = %s")
+        params.insert(0, user_id)
+
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+
+    pending = 0
+    async for rows in database.stream(f"""
+        SELECT a.id, a.user_id, u.email, a.start_time, a.end_time,
+               ROUND(EXTRACT(EPOCH FROM (COALESCE(a.end_time, NOW()) - a.start_time)) / 60.0, 2),
+               a.application, a.window_title, a.client_identified,
+               a.ai_analysis->>'project_or_task', a.ai_analysis->>'description',
+               a.category, a.productivity_score, a.status, a.entry_type
+        FROM activities a
+        LEFT JOIN users u ON u.id = a.user_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY a.start_time, a.id
+    """, params, EXPORT_FETCH_SIZE):
+        for row in rows:
+            if writer:
+                writer.writerow([_plain(v) for v in row])
+            else:
+                buf.write(json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), ensure_ascii=False))
+                buf.write("\n")
+            pending += 1
+            if pending >= EXPORT_FLUSH_ROWS:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+                pending = 0
+
+    tail = buf.getvalue()
+    if tail:
+        yield tail
@@ -0,0 +1,116 @@
+# frame_dedup.py
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# ====== Dedup config ======
+FRAME_DEDUP_ENABLED = os.getenv("FRAME_DEDUP_ENABLED", "1") == "1"
+PHASH_SIZE = int(os.getenv("PHASH_SIZE", "16"))                              # 16 → 256-bit dHash
+PHASH_DISTANCE_THRESHOLD = int(os.getenv("PHASH_DISTANCE_THRESHOLD", "8"))   # max differing bits to count as "same frame"
+PHASH_MAX_AGE = float(os.getenv("PHASH_MAX_AGE", "900"))                     # don't reuse an analysis older than this (s)
+
+
+def dhash(image_bytes: bytes, size: int = PHASH_SIZE) -> int:
+    """
+    Difference hash: shrink to (size+1)×size greyscale and record whether each
+    pixel is brighter than its right neighbour. A cursor blink or clock tick
+    flips at most a bit or two; a different document flips dozens.
+    """
+    # Imported on first use: numpy + Pillow add ~0.2s to API startup
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img.draft("L", (size * 8, size * 8))   # cheap downscale on decode where the codec supports it
+        small = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+    px = np.asarray(small, dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@dataclass
+class AnalyzedFrame:
+    frame_hash: int
+    extracted_text: str
+    ai_analysis: Dict
+    ai_response: str
+    analyzed_at: float
+
+
+class FrameDeduplicator:
+    """
+    Remembers the last analyzed frame per user. If a new frame's dHash is within
+    `threshold` bits of it, callers reuse that OCR text + analysis instead of
+    running OCR and the LLM again.
+    """
+
+    def __init__(self, threshold: int = PHASH_DISTANCE_THRESHOLD, max_age: float = PHASH_MAX_AGE,
+                 enabled: bool = FRAME_DEDUP_ENABLED):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.enabled = enabled
+        self._frames: Dict[int, AnalyzedFrame] = {}
+        self._lock = threading.Lock()
+
+        # metrics
+        self._checked = 0
+        self._skipped = 0
+        self._hash_errors = 0
+
+    def fingerprint(self, image_bytes: bytes) -> Optional[int]:
+        if not self.enabled:
+            return None
+        try:
+            return dhash(image_bytes)
+        except Exception as e:
+            print("Frame hash failed:", str(e))
+            with self._lock:
+                self._hash_errors += 1
+            return None
+
+    def lookup(self, user_id: int, frame_hash: Optional[int]) -> Optional[AnalyzedFrame]:
+        if frame_hash is None:
+            return None
+        with self._lock:
+            self._checked += 1
+            last = self._frames.get(user_id)
+            if last is None or time.time() - last.analyzed_at > self.max_age:
+                return None
+            if hamming(last.frame_hash, frame_hash) > self.threshold:
+                return None
+            self._skipped += 1
+            return last
+
+    def remember(self, user_id: int, frame_hash: Optional[int], extracted_text: str,
+                 ai_analysis: Dict, ai_response: str):
+        if frame_hash is None:
+            return
+        with self._lock:
+            self._frames[user_id] = AnalyzedFrame(frame_hash, extracted_text, dict(ai_analysis),
+                                                  ai_response, time.time())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold_bits": self.threshold,
+                "frames_checked": self._checked,
+                "analyses_skipped": self._skipped,
+                "skip_ratio": round(self._skipped / self._checked, 4) if self._checked else 0.0,
+                "hash_errors": self._hash_errors,
+            }
+
+
+frame_dedup = FrameDeduplicator()
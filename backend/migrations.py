@@ -0,0 +1,251 @@
+# migrations.py
+"""
+Versioned schema migrations.
+
+All DDL the backend needs lives in the numbered migrations below. migrate() applies the
+ones not yet recorded in schema_migrations, in order, each in its own transaction, while
+holding an advisory lock — several API workers starting together apply every migration
+exactly once; the others wait for the lock and then find nothing to do.
+
+The early versions are idempotent (IF NOT EXISTS / OR REPLACE), so a database created
+before this module existed is adopted as-is on the first run. Migrations are append-only:
+to change a table or a SQL function, add a new version instead of editing an applied one.
+
+    python -m backend.migrations            # apply pending migrations (deploy step)
+    python -m backend.migrations status     # applied / pending versions
+
+The API also migrates on startup unless MIGRATE_ON_STARTUP=0 — except for the versions in
+DEPLOY_STEP_MIGRATIONS, which rewrite whole tables. While those would have rows to copy,
+startup refuses to apply them and the API doesn't start: run the command above (with the
+API stopped or MIGRATE_ON_STARTUP=0), then start it. On an empty database they run on
+startup like any other.
+
+Migration 10 (monthly partitions, see partitions.py) needs PostgreSQL 14 or later.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from .db_pool import get_connection
+from .db_indexes import ensure_indexes
+from . import analysis_jobs
+from . import analysis_cache
+from . import client_index
+from . import user_cache
+from . import rollups
+from . import etags
+from . import sessions
+from . import partitions
+
+
+load_dotenv()
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+
+
+# ====== Migrations ======
+def _base_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            name TEXT,
+            email TEXT UNIQUE,
+            password_hash TEXT,
+            role TEXT CHECK(role IN ('employee','admin')) NOT NULL DEFAULT 'employee'
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS activities (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            application TEXT,
+            window_title TEXT,
+            screenshot_path TEXT,
+            extracted_text TEXT,
+            ai_analysis JSONB,
+            client_identified TEXT,
+            category TEXT,
+            productivity_score INTEGER,
+            duration_minutes INTEGER
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS clients (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) UNIQUE NOT NULL,
+            contact_email VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS screenshots (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            activity_id INTEGER REFERENCES activities(id) ON DELETE SET NULL,
+            path TEXT NOT NULL,
+            taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _activity_entry_columns(cur):
+    # Manual entries carry a status; entry_type tells them apart from uploaded frames
+    cur.execute("""
+        ALTER TABLE activities
+            ADD COLUMN IF NOT EXISTS status TEXT,
+            ADD COLUMN IF NOT EXISTS entry_type TEXT
+    """)
+
+
+def _partition_by_month(cur):
+    partitions.partition_tables(cur)
+    # The old tables took their indexes and triggers with them
+    ensure_indexes(cur)
+    etags.ensure_partition_triggers(cur)
+    # Row lookups by (id, start_time), so they touch one partition
+    rollups.ensure_partition_lookups(cur)
+    sessions.ensure_partition_lookups(cur)
+
+
+class DeployStepRequired(RuntimeError):
+    """A pending migration must be applied with `python -m backend.migrations`, not on API startup."""
+
+
+def _job_activity_start_time(cur):
+    analysis_jobs.ensure_activity_start_time(cur)
+    sessions.ensure_job_start_time(cur)
+
+
+# version → check(cur): True while applying it would rewrite rows under an exclusive lock
+DEPLOY_STEP_MIGRATIONS: Dict[int, Callable] = {
+    10: partitions.has_rows,
+}
+
+
+# (version, name, apply(cur)) — append only
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "base tables", _base_tables),
+    (2, "activity status / entry_type", _activity_entry_columns),
+    (3, "analysis jobs queue", analysis_jobs.ensure_schema),
+    (4, "LLM analysis cache", analysis_cache.ensure_schema),
+    (5, "shared cache versions", client_index.ensure_schema),
+    (6, "user + time indexes", ensure_indexes),
+    (7, "daily user rollups", rollups.ensure_schema),
+    (8, "per-day change versions for ETags", etags.ensure_schema),
+    (9, "single-statement upload persistence", sessions.ensure_schema),
+    (10, "monthly partitions for activities / screenshots", _partition_by_month),
+    (11, "analysis jobs carry the activity start_time", _job_activity_start_time),
+    (12, "uploads extend the cached session without a read", sessions.ensure_session_claim),
+    (13, "user writes bump the user cache version", user_cache.ensure_schema),
+]
+
+
+# ====== Runner ======
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            duration_ms INTEGER
+        )
+    """)
+
+
+def _applied(cur) -> Dict[int, datetime]:
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return {}
+    cur.execute("SELECT version, applied_at FROM schema_migrations")
+    return {version: applied_at for version, applied_at in cur.fetchall()}
+
+
+def migrate(target: Optional[int] = None, startup: bool = False) -> List[int]:
+    """
+    Apply pending migrations up to `target` (default: all). Returns the versions applied.
+    With `startup`, stops at a deploy-step migration that has rows to rewrite and raises
+    DeployStepRequired (the versions before it stay applied).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    done = []
+    try:
+        # Session-level lock: held across the per-migration commits below
+        cur.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+        _ensure_table(cur)
+        conn.commit()
+
+        applied = _applied(cur)
+        for version, name, apply in MIGRATIONS:
+            if version in applied or (target is not None and version > target):
+                continue
+            check = DEPLOY_STEP_MIGRATIONS.get(version)
+            if startup and check is not None and check(cur):
+                raise DeployStepRequired(
+                    f"Migration {version} ({name}) rewrites populated tables under an exclusive lock "
+                    f"and is not applied on startup: run `python -m backend.migrations` as a deploy step "
+                    f"(API stopped or MIGRATE_ON_STARTUP=0), then start the API"
+                )
+            started = time.perf_counter()
+            apply(cur)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                (version, name, duration_ms)
+            )
+            conn.commit()
+            done.append(version)
+            print(f"Applied migration {version}: {name} ({duration_ms} ms)")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'))")
+        conn.commit()
+        cur.close()
+        conn.close()
+    return done
+
+
+def status(cur) -> Dict:
+    """Current / latest version and what is still pending (for /api/admin/metrics and the CLI)."""
+    applied = _applied(cur)
+    return {
+        "version": max(applied) if applied else 0,
+        "latest": MIGRATIONS[-1][0],
+        "pending": [version for version, _, _ in MIGRATIONS if version not in applied],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply / inspect schema migrations")
+    sub = parser.add_subparsers(dest="command")
+    up = sub.add_parser("migrate", help="apply pending migrations (default)")
+    up.add_argument("--to", dest="target", type=int, default=None)
+    sub.add_parser("status", help="show applied and pending versions")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            applied = _applied(cur)
+            for version, name, _ in MIGRATIONS:
+                mark = applied[version].strftime("%Y-%m-%d %H:%M") if version in applied else "pending"
+                print(f"{version:>4}  {name:<40} {mark}")
+        finally:
+            cur.close()
+            conn.close()
+        return
+
+    done = migrate(getattr(args, "target", None))
+    print(f"Applied {len(done)} migration(s)" if done else "Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
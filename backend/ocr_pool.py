@@ -0,0 +1,162 @@
+# ocr_pool.py
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# ====== OCR pool config ======
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+OCR_MAX_BACKLOG = int(os.getenv("OCR_MAX_BACKLOG", str(OCR_WORKERS * 4)))   # queued + running jobs
+OCR_SUBMIT_TIMEOUT = float(os.getenv("OCR_SUBMIT_TIMEOUT", "10"))          # wait this long for a backlog slot
+OCR_JOB_TIMEOUT = float(os.getenv("OCR_JOB_TIMEOUT", "60"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+LATENCY_WINDOW = 512
+
+
+class OCRBacklogFull(Exception):
+    """Raised when the OCR backlog stays at OCR_MAX_BACKLOG for longer than the submit timeout."""
+
+
+def _ocr_image_bytes(data: bytes, lang: str):
+    """Runs inside a worker process. Returns (text, seconds spent in tesseract)."""
+    from PIL import Image
+    import pytesseract
+
+    started = time.perf_counter()
+    with Image.open(io.BytesIO(data)) as image:
+        text = pytesseract.image_to_string(image, lang=lang).strip()
+    return text, time.perf_counter() - started
+
+
+class OCRPool:
+    """
+    Process pool for pytesseract so OCR uses every core instead of one request thread.
+
+    Callers hand over the image bytes they already have in memory; workers never touch
+    the screenshots directory. At most `max_backlog` jobs may be queued or running —
+    submit() waits up to `submit_timeout` for a slot and then raises OCRBacklogFull, so
+    a burst of uploads turns into back-pressure instead of unbounded memory growth.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, max_backlog: int = OCR_MAX_BACKLOG,
+                 submit_timeout: float = OCR_SUBMIT_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_backlog = max(self.workers, max_backlog)
+        self.submit_timeout = submit_timeout
+        # spawn: the API process runs threads, which don't mix well with fork()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._slots = threading.BoundedSemaphore(self.max_backlog)
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+
+        # metrics
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._errors = 0
+        self._rejected = 0
+        self._busy_total = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def submit(self, data: bytes, lang: str = OCR_LANG) -> Future:
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            with self._lock:
+                self._rejected += 1
+            raise OCRBacklogFull(f"OCR backlog full ({self.max_backlog} jobs)")
+
+        submitted_at = time.monotonic()
+        with self._lock:
+            self._pending += 1
+            self._submitted += 1
+        try:
+            future = self._executor.submit(_ocr_image_bytes, data, lang)
+        except Exception:
+            self._job_done(submitted_at, None)
+            raise
+        future.add_done_callback(lambda f: self._job_done(submitted_at, f))
+        return future
+
+    def _job_done(self, submitted_at: float, future: Optional[Future]):
+        latency = time.monotonic() - submitted_at
+        busy = 0.0
+        failed = future is None or future.cancelled() or future.exception() is not None
+        if not failed:
+            busy = future.result()[1]
+        with self._lock:
+            self._pending -= 1
+            if failed:
+                self._errors += 1
+            else:
+                self._completed += 1
+                self._busy_total += busy
+                self._latencies.append(latency)
+        self._slots.release()
+
+    def image_to_string(self, data: bytes, lang: str = OCR_LANG, timeout: float = OCR_JOB_TIMEOUT) -> str:
+        return self.submit(data, lang).result(timeout=timeout)[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            elapsed = max(time.monotonic() - self._started_at, 1e-9)
+
+            def pct(p):
+                if not latencies:
+                    return 0.0
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+            return {
+                "workers": self.workers,
+                "max_backlog": self.max_backlog,
+                "queue_length": self._pending,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "errors": self._errors,
+                "rejected": self._rejected,
+                "latency_p50_ms": pct(0.50),
+                "latency_p95_ms": pct(0.95),
+                "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+                "worker_utilisation": round(self._busy_total / (self.workers * elapsed), 4),
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# ====== Shared process-wide pool ======
+_pool: Optional[OCRPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> OCRPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OCRPool()
+    return _pool
+
+
+def ocr_stats() -> dict:
+    # Don't spin up worker processes just to report that nothing ran
+    return _pool.stats() if _pool is not None else {"workers": 0, "queue_length": 0}
+
+
+def shutdown_ocr_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
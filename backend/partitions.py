@@ -0,0 +1,423 @@
+# partitions.py
+"""
+Monthly range partitions for activities (by start_time) and screenshots (by taken_at).
+
+Migration 10 converts both tables in place. It copies every row under an ACCESS EXCLUSIVE
+lock, so on a populated database it is a deploy step (`python -m backend.migrations`) that
+API startup refuses to run. Requires PostgreSQL 14+: DETACH ... CONCURRENTLY and
+pg_inherits.inhdetachpending are 14 features. Dashboard queries bound the time column to
+one day, so the planner prunes to a single partition and its (user_id, time) index, and
+"latest activity per user" is an ordered Append that stops in the newest partition.
+
+There is no DEFAULT partition — a row for a month without a partition is an error — so
+partitions are created ahead of time: the current month plus PARTITION_MONTHS_AHEAD, on
+startup and every PARTITION_CHECK_INTERVAL seconds (any API worker; creation is
+serialised by an advisory lock). Without a default partition old months can also leave
+with DETACH ... CONCURRENTLY, which doesn't block readers or writers.
+
+Retention is therefore a catalog operation, not a DELETE over millions of rows: whole
+months older than the cutoff are detached (and dropped with PARTITION_RETENTION_DROP=1 /
+--drop). A detached table keeps its rows for archiving, e.g. pg_dump -t activities_y2025m01.
+daily_user_rollups is left alone, so historical totals outlive the raw rows — don't run
+`rollups rebuild` over detached days.
+
+    python -m backend.partitions status
+    python -m backend.partitions ensure [--ahead 3]
+    python -m backend.partitions detach --before 2025-01-01 [--drop]
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from .db_pool import get_connection
+
+
+load_dotenv()
+
+# ====== Partition config ======
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))           # future months kept ready
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))   # detach older months; 0 keeps all
+PARTITION_RETENTION_DROP = os.getenv("PARTITION_RETENTION_DROP", "0") == "1"     # drop detached months too
+PARTITION_CHECK_INTERVAL = float(os.getenv("PARTITION_CHECK_INTERVAL", "21600"))  # seconds between maintenance passes
+
+# table → partition key
+PARTITIONED_TABLES = {
+    "activities": "start_time",
+    "screenshots": "taken_at",
+}
+
+_NAME = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def retention_cutoff(months: int, today: Optional[date] = None) -> date:
+    """First day kept when keeping `months` full months before the current one."""
+    today = today or date.today()
+    return add_months(today.replace(day=1), -months)
+
+
+def is_partitioned(cur, table: str) -> bool:
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def list_partitions(cur, table: str) -> List[Tuple[str, date, bool]]:
+    """(name, month, detach_pending) of the monthly partitions attached to `table`, oldest first."""
+    cur.execute("""
+        SELECT c.relname, i.inhdetachpending
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (table,))
+    result = []
+    for name, pending in cur.fetchall():
+        m = _NAME.search(name)
+        if m:   # partitions attached by hand under other names are left to whoever made them
+            result.append((name, date(int(m.group(1)), int(m.group(2)), 1), pending))
+    return sorted(result, key=lambda p: p[1])
+
+
+def _create_partition(cur, table: str, month: date):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(table, month)}
+        PARTITION OF {table}
+        FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')
+    """)
+
+
+def _current_month(cur) -> date:
+    # The database clock: NOW() is what writers put into the partition keys
+    cur.execute("SELECT date_trunc('month', LOCALTIMESTAMP)::date")
+    return cur.fetchone()[0]
+
+
+# ====== Migration ======
+MIN_SERVER_VERSION = 140000
+
+
+def has_rows(cur) -> bool:
+    """True while partition_tables() would have rows to copy (see migrations.DEPLOY_STEP_MIGRATIONS)."""
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(cur, table):
+            continue
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+        if cur.fetchone()[0]:
+            return True
+    return False
+
+
+def partition_tables(cur) -> List[str]:
+    """
+    Convert activities / screenshots into monthly-partitioned tables (migration 10).
+
+    A partitioned table's primary key must include the partition key, so it becomes
+    (id, time); foreign keys pointing at the tables (screenshots.activity_id,
+    analysis_jobs.activity_id) can't be kept and are dropped. Rows are copied once under
+    an ACCESS EXCLUSIVE lock; ids keep their sequence. The caller recreates indexes and
+    triggers afterwards. Returns the tables converted.
+    """
+    cur.execute("SHOW server_version_num")
+    if int(cur.fetchone()[0]) < MIN_SERVER_VERSION:
+        raise RuntimeError("Monthly partitions need PostgreSQL 14 or later (DETACH PARTITION ... CONCURRENTLY)")
+    converted = []
+    for table, key in PARTITIONED_TABLES.items():
+        if is_partitioned(cur, table):
+            continue
+
+        cur.execute("""
+            SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE confrelid = %s::regclass AND contype = 'f'
+        """, (table,))
+        for referencing, constraint in cur.fetchall():
+            print(f"Dropping foreign key {constraint} on {referencing} (can't reference a partitioned {table})")
+            cur.execute(f"ALTER TABLE {referencing} DROP CONSTRAINT {constraint}")
+
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+        sequence = cur.fetchone()[0]
+        cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        # The key becomes NOT NULL; rows without one land in the 1970-01 partition
+        cur.execute(f"UPDATE {table} SET {key} = 'epoch' WHERE {key} IS NULL")
+
+        staging = f"{table}_partitioned"
+        cur.execute(f"""
+            CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE ({key})
+        """)
+        cur.execute(f"ALTER TABLE {staging} ALTER COLUMN {key} SET NOT NULL")
+
+        cur.execute(f"SELECT DISTINCT date_trunc('month', {key})::date FROM {table}")
+        months = {row[0] for row in cur.fetchall()}
+        current = _current_month(cur)
+        months.update(add_months(current, i) for i in range(PARTITION_MONTHS_AHEAD + 1))
+        for month in sorted(months):
+            cur.execute(f"""
+                CREATE TABLE {partition_name(table, month)}
+                PARTITION OF {staging}
+                FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')
+            """)
+
+        cur.execute(f"INSERT INTO {staging} SELECT * FROM {table}")
+        copied = cur.rowcount
+        if sequence:
+            cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+        cur.execute(f"DROP TABLE {table}")
+        cur.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        if sequence:
+            cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        cur.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {key})")
+        cur.execute(f"""
+            ALTER TABLE {table}
+            ADD FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        """)
+        cur.execute(f"ANALYZE {table}")
+        converted.append(table)
+        print(f"Partitioned {table} by month on {key}: {copied} row(s) in {len(months)} partition(s)")
+    return converted
+
+
+# ====== Maintenance ======
+def ensure_partitions(cur, ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create any missing partition from the current month to `ahead` months out. Returns the names created."""
+    # Two workers creating the same partition would collide in the catalog
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('partitions'))")
+    current = _current_month(cur)
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(cur, table):
+            continue   # not migrated yet
+        existing = {name for name, _, _ in list_partitions(cur, table)}
+        for i in range(ahead + 1):
+            month = add_months(current, i)
+            name = partition_name(table, month)
+            if name not in existing:
+                # checked first: CREATE ... PARTITION OF locks the parent table
+                _create_partition(cur, table, month)
+                created.append(name)
+    if created:
+        print(f"Created partition(s): {', '.join(created)}")
+    return created
+
+
+def _forget_detached(cur, table: str, key: str, name: str):
+    # ETags for the detached days must change: the rows are gone from the dashboards
+    cur.execute(f"""
+        SELECT bump_user_day_version(user_id, day)
+        FROM (SELECT DISTINCT user_id, {key}::date AS day FROM {name} WHERE user_id IS NOT NULL) d
+    """)
+    if table == "activities":
+        # no foreign key cascades these any more
+        cur.execute(f"DELETE FROM analysis_jobs WHERE activity_id IN (SELECT id FROM {name})")
+
+
+def detach_before(before: date, drop: bool = False) -> List[str]:
+    """
+    Detach every monthly partition that ends on or before `before` (whole months only),
+    and drop it if `drop`. Runs on its own autocommit connection: DETACH ... CONCURRENTLY
+    can't run inside a transaction. Returns the partitions detached; empty when another
+    process is already running retention.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    if before > _current_month(cur):
+        cur.close()
+        conn.close()
+        raise ValueError(f"refusing to detach the current month or later (cutoff {before})")
+    conn.commit()
+
+    conn.raw.autocommit = True
+    detached = []
+    try:
+        cur.execute("SELECT pg_try_advisory_lock(hashtext('partitions_retention'))")
+        if not cur.fetchone()[0]:
+            return detached
+        try:
+            for table, key in PARTITIONED_TABLES.items():
+                if not is_partitioned(cur, table):
+                    continue
+                for name, month, pending in list_partitions(cur, table):
+                    if add_months(month, 1) > before:
+                        break
+                    # an interrupted CONCURRENTLY detach leaves the partition pending
+                    mode = "FINALIZE" if pending else "CONCURRENTLY"
+                    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name} {mode}")
+                    _forget_detached(cur, table, key, name)
+                    if drop:
+                        cur.execute(f"DROP TABLE {name}")
+                    detached.append(name)
+                    print(f"{'Dropped' if drop else 'Detached'} partition {name}")
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(hashtext('partitions_retention'))")
+    finally:
+        if not conn.raw.closed:
+            conn.raw.autocommit = False
+        cur.close()
+        conn.close()
+    return detached
+
+
+def status(cur) -> Dict:
+    """Per table: partitioned or not, partition count and the oldest / newest month (for /api/admin/metrics)."""
+    report = {}
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(cur, table):
+            report[table] = {"partitioned": False}
+            continue
+        parts = list_partitions(cur, table)
+        report[table] = {
+            "partitioned": True,
+            "partitions": len(parts),
+            "oldest": parts[0][1].strftime("%Y-%m") if parts else None,
+            "newest": parts[-1][1].strftime("%Y-%m") if parts else None,
+        }
+    return report
+
+
+class PartitionMaintainer:
+    """
+    Background thread that keeps future partitions in place and, with
+    PARTITION_RETENTION_MONTHS set, detaches months past retention.
+    """
+
+    def __init__(self, ahead: int = PARTITION_MONTHS_AHEAD, retention_months: int = PARTITION_RETENTION_MONTHS,
+                 drop: bool = PARTITION_RETENTION_DROP, interval: float = PARTITION_CHECK_INTERVAL):
+        self.ahead = max(1, ahead)
+        self.retention_months = max(0, retention_months)
+        self.drop = drop
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # metrics
+        self._runs = 0
+        self._created = 0
+        self._detached = 0
+        self._last_run: Optional[datetime] = None
+        self._last_error: Optional[str] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        try:
+            self.run_once()
+        except Exception as e:
+            print("Partition maintenance failed:", str(e))
+        self._thread = threading.Thread(target=self._loop, name="partition-maintainer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self):
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            created = ensure_partitions(cur, self.ahead)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            with self._lock:
+                self._last_error = str(e)
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+        detached = []
+        if self.retention_months:
+            detached = detach_before(retention_cutoff(self.retention_months), self.drop)
+
+        with self._lock:
+            self._runs += 1
+            self._created += len(created)
+            self._detached += len(detached)
+            self._last_run = datetime.now()
+            self._last_error = None
+
+    def _loop(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print("Partition maintenance failed:", str(e))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "months_ahead": self.ahead,
+                "retention_months": self.retention_months,
+                "drop_detached": self.drop,
+                "runs": self._runs,
+                "created": self._created,
+                "detached": self._detached,
+                "last_run": self._last_run,
+                "last_error": self._last_error,
+            }
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+def _parse_day(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of activities / screenshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="list partitions per table")
+    en = sub.add_parser("ensure", help="create partitions from the current month onwards")
+    en.add_argument("--ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    de = sub.add_parser("detach", help="detach months that end on or before --before")
+    de.add_argument("--before", type=_parse_day, required=True)
+    de.add_argument("--drop", action="store_true", help="drop the detached tables")
+    args = parser.parse_args(argv)
+
+    if args.command == "detach":
+        started = time.perf_counter()
+        detached = detach_before(args.before, args.drop)
+        print(f"{len(detached)} partition(s) {'dropped' if args.drop else 'detached'} "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        if args.command == "ensure":
+            created = ensure_partitions(cur, args.ahead)
+            conn.commit()
+            print(f"Created {len(created)} partition(s)" if created else "All partitions present")
+            return
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cur, table):
+                print(f"{table}: not partitioned (run migrations)")
+                continue
+            print(f"{table}:")
+            for name, month, pending in list_partitions(cur, table):
+                cur.execute(f"SELECT COUNT(*) FROM {name}")
+                print(f"  {name:<24} {month:%Y-%m}  {cur.fetchone()[0]:>9} row(s){'  detach pending' if pending else ''}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# password_pool.py
+"""
+bcrypt on a dedicated process pool, off the request threadpool.
+
+bcrypt is deliberately slow (~0.25s at cost 12) and holds a core for the whole time. On
+the shared threadpool a burst of logins starves every other sync endpoint, so hashing and
+verification run in PASSWORD_WORKERS processes instead. At most that many run at once;
+further callers wait in an asyncio queue of up to PASSWORD_MAX_QUEUE entries for at most
+PASSWORD_QUEUE_TIMEOUT seconds and then get PasswordPoolBusy (the API answers 503).
+
+The cost comes from BCRYPT_ROUNDS. Hashes made with a different cost are reported by
+verify_and_update() together with a fresh hash, so logins migrate stored hashes whenever
+the setting changes.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# ====== Password pool config ======
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# processes = max concurrent hashes; half the cores by default so requests keep the rest
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+PASSWORD_MAX_QUEUE = int(os.getenv("PASSWORD_MAX_QUEUE", "64"))              # callers allowed to wait for a worker
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "10"))    # max wait for a worker (s)
+LATENCY_WINDOW = 512
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the wait queue is full or a caller waited longer than the queue timeout."""
+
+
+# ====== Worker side ======
+_contexts = {}
+
+
+def _context(rounds: int):
+    # Pinning min / max rounds makes needs_update() flag hashes of any other cost
+    ctx = _contexts.get(rounds)
+    if ctx is None:
+        from passlib.context import CryptContext
+        ctx = _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"], deprecated="auto",
+            bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds,
+        )
+    return ctx
+
+
+def _hash(password: str, rounds: int):
+    """Runs inside a worker process. Returns (hash, seconds spent)."""
+    started = time.perf_counter()
+    return _context(rounds).hash(password), time.perf_counter() - started
+
+
+def _verify_and_update(password: str, password_hash: str, rounds: int):
+    """Runs inside a worker process. Returns ((valid, new_hash or None), seconds spent)."""
+    started = time.perf_counter()
+    try:
+        result = _context(rounds).verify_and_update(password, password_hash)
+    except (ValueError, TypeError):
+        result = (False, None)   # malformed / legacy hash → treat as a wrong password
+    return result, time.perf_counter() - started
+
+
+# ====== API side ======
+class PasswordPool:
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_queue: int = PASSWORD_MAX_QUEUE,
+                 queue_timeout: float = PASSWORD_QUEUE_TIMEOUT, rounds: int = BCRYPT_ROUNDS):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.rounds = rounds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+        # metrics
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._errors = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._waits = deque(maxlen=LATENCY_WINDOW)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the API doesn't spawn processes
+        with self._lock:
+            if self._executor is None:
+                # spawn: the API process runs threads, which don't mix well with fork()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.workers)
+            self._loop = loop
+        return self._semaphore
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise PasswordPoolBusy(f"password queue full ({self.max_queue} waiting)")
+            self._waiting += 1
+
+        semaphore = self._get_semaphore()
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._rejected += 1
+            raise PasswordPoolBusy(f"no password worker free after {self.queue_timeout:.0f}s")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        started = time.monotonic()
+        with self._lock:
+            self._running += 1
+            self._waits.append(started - queued_at)
+        try:
+            result, _ = await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            semaphore.release()
+            with self._lock:
+                self._running -= 1
+        with self._lock:
+            self._completed += 1
+            self._latencies.append(time.monotonic() - started)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify_and_update(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash) — new_hash is set when the stored hash should be replaced."""
+        if not password_hash:
+            return False, None
+        valid, new_hash = await self._run(_verify_and_update, password, password_hash, self.rounds)
+        if new_hash:
+            with self._lock:
+                self._rehashed += 1
+        return valid, new_hash
+
+    def hash_sync(self, password: str) -> str:
+        """Blocking hash for startup / CLI code that has no event loop (skips the queue)."""
+        return self._get_executor().submit(_hash, password, self.rounds).result()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            latencies = sorted(self._latencies)
+
+            def pct(values, p):
+                if not values:
+                    return 0.0
+                return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 1)
+
+            return {
+                "workers": self.workers,
+                "bcrypt_rounds": self.rounds,
+                "started": self._executor is not None,
+                "max_queue": self.max_queue,
+                "waiting": self._waiting,
+                "running": self._running,
+                "completed": self._completed,
+                "errors": self._errors,
+                "rejected": self._rejected,
+                "rehashed": self._rehashed,
+                "queue_wait_p50_ms": pct(waits, 0.50),
+                "queue_wait_p95_ms": pct(waits, 0.95),
+                "latency_p50_ms": pct(latencies, 0.50),
+                "latency_p95_ms": pct(latencies, 0.95),
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+password_pool = PasswordPool()
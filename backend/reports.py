@@ -0,0 +1,116 @@
+# reports.py
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+GRANULARITIES = ("day", "week", "month")
+MAX_REPORT_DAYS = 366
+
+
+def _num(value):
+    return float(value) if isinstance(value, Decimal) else (value or 0)
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(start: date, end: date, granularity: str) -> List[date]:
+    """Every bucket touching [start, end], so empty days/weeks/months still show up as 0."""
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        if granularity == "day":
+            current += timedelta(days=1)
+        elif granularity == "week":
+            current += timedelta(days=7)
+        else:
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return buckets
+
+
+async def build_activity_report(db, user_id: int, start: date, end: date, granularity: str = "day",
+                          label: Optional[Callable[[date], str]] = None) -> Dict:
+    """
+    Aggregate a user's closed activities over [start, end] (inclusive days) in a single
+    GROUPING SETS query — per time bucket, per category, per client and overall — so
+    only a handful of rows cross the wire regardless of how many activities there are.
+
+    Returns the same shape the weekly report always had (minus week_start / week_end
+    and username, which the caller adds). `label` formats bucket keys; ISO dates by default.
+    """
+    label = label or (lambda d: d.isoformat())
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+    rows = await db.fetch_all("""
+        SELECT GROUPING(bucket), GROUPING(category), GROUPING(client),
+               bucket, category, client,
+               COALESCE(SUM(duration), 0),
+               COALESCE(SUM(duration) FILTER (WHERE productivity_score >= 7), 0),
+               COALESCE(SUM(productivity_score) FILTER (WHERE productivity_score <> 0), 0),
+               COUNT(productivity_score) FILTER (WHERE productivity_score <> 0),
+               COUNT(*),
+               MIN(start_time)
+        FROM (
+            SELECT date_trunc(%s, start_time)::date AS bucket,
+                   NULLIF(category, '') AS category,
+                   NULLIF(NULLIF(client_identified, 'None'), '') AS client,
+                   productivity_score,
+                   start_time,
+                   ROUND(EXTRACT(EPOCH FROM (end_time - start_time)) / 60.0, 2) AS duration
+            FROM activities
+            WHERE user_id = %s
+              AND start_time >= %s AND start_time < %s
+              AND end_time IS NOT NULL
+        ) a
+        GROUP BY GROUPING SETS ((bucket), (category), (client), ())
+    """, (granularity, user_id, range_start, range_end))
+
+    total_time = 0
+    productive_time = 0
+    score_sum = 0
+    score_count = 0
+    category_time = {}
+    client_duration = {}
+    client_rank = []
+    daily_time = {label(b): 0 for b in bucket_starts(start, end, granularity)}
+
+    for (g_bucket, g_category, g_client, bucket, category, client,
+         duration, productive, scores, scored, tasks, first_seen) in rows:
+        duration = _num(duration)
+        if not g_bucket:
+            daily_time[label(bucket)] = daily_time.get(label(bucket), 0) + duration
+        elif not g_category:
+            if category:
+                category_time[category] = duration
+        elif not g_client:
+            if client:
+                client_duration[client] = duration
+                client_rank.append((tasks, first_seen, client))
+        else:
+            total_time = duration
+            productive_time = _num(productive)
+            score_sum = _num(scores)
+            score_count = scored
+
+    # Most frequent clients first; ties keep first-seen order like the old Python loop
+    client_rank.sort(key=lambda r: (-r[0], r[1]))
+    top_clients = [(client, tasks) for tasks, _, client in client_rank[:3]]
+
+    return {
+        "summary": {
+            "total_hours": round(total_time / 60, 2),
+            "productive_hours": round(productive_time / 60, 2),
+            "avg_productivity": round(score_sum / score_count, 2) if score_count else 0,
+            "top_clients": top_clients,
+        },
+        "category_breakdown": category_time,
+        "daily_breakdown": daily_time,
+        "client_duration": client_duration,
+    }
@@ -0,0 +1,209 @@
+# rollups.py
+"""
+Per-user daily rollups of activities, maintained incrementally.
+
+Every writer that inserts or changes an activity calls `retract()` before the change
+and `apply()` after it, in the same transaction. Both go through the SQL function
+apply_activity_rollup(), which locks the activity row, so concurrent writers to the
+same activity serialise and the rollup always equals SUM over the raw rows.
+
+Rebuild / backfill:
+    python -m backend.rollups rebuild [--user ID] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from .db_pool import get_connection
+
+
+def ensure_schema(cur):
+    cur.execute("SELECT to_regclass('daily_user_rollups') IS NULL")
+    created = cur.fetchone()[0]
+
+    # client / category use '' for NULL so they can be part of the primary key
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_user_rollups (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            client TEXT NOT NULL DEFAULT '',
+            category TEXT NOT NULL DEFAULT '',
+            minutes NUMERIC NOT NULL DEFAULT 0,
+            productivity_sum BIGINT NOT NULL DEFAULT 0,
+            productivity_count INTEGER NOT NULL DEFAULT 0,
+            task_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, client, category)
+        )
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION apply_activity_rollup(p_activity_id INTEGER, p_sign INTEGER)
+        RETURNS void LANGUAGE sql AS $$
+            WITH a AS (
+                SELECT user_id, start_time, client_identified, category, duration_minutes, productivity_score
+                FROM activities
+                WHERE id = p_activity_id AND user_id IS NOT NULL AND start_time IS NOT NULL
+                FOR UPDATE
+            )
+            INSERT INTO daily_user_rollups AS r
+                (user_id, day, client, category, minutes, productivity_sum, productivity_count, task_count)
+            SELECT a.user_id,
+                   a.start_time::date,
+                   COALESCE(a.client_identified, ''),
+                   COALESCE(a.category, ''),
+                   p_sign * COALESCE(a.duration_minutes, 0),
+                   p_sign * COALESCE(a.productivity_score, 0),
+                   p_sign * (a.productivity_score IS NOT NULL)::int,
+                   p_sign
+            FROM a
+            ON CONFLICT (user_id, day, client, category) DO UPDATE
+            SET minutes = r.minutes + EXCLUDED.minutes,
+                productivity_sum = r.productivity_sum + EXCLUDED.productivity_sum,
+                productivity_count = r.productivity_count + EXCLUDED.productivity_count,
+                task_count = r.task_count + EXCLUDED.task_count
+        $$
+    """)
+
+    if created:
+        print("Created daily_user_rollups — backfilling from activities...")
+        rebuild(cur)
+
+
+def ensure_partition_lookups(cur):
+    """Migration 10: apply_activity_rollup() takes the activity's start_time as well."""
+    # p_start_time is the activity's partition key (see partitions.py): with it the lookup
+    # touches one partition, without it every partition's primary key is probed. Replaces
+    # migration 7's 2-argument form; keeping both would make 2-argument calls ambiguous.
+    cur.execute("DROP FUNCTION IF EXISTS apply_activity_rollup(INTEGER, INTEGER)")
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION apply_activity_rollup(
+            p_activity_id INTEGER, p_sign INTEGER, p_start_time TIMESTAMP DEFAULT NULL
+        )
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF p_start_time IS NULL THEN
+                SELECT start_time INTO p_start_time FROM activities WHERE id = p_activity_id;
+            END IF;
+
+            WITH a AS (
+                SELECT user_id, start_time, client_identified, category, duration_minutes, productivity_score
+                FROM activities
+                WHERE id = p_activity_id AND start_time = p_start_time AND user_id IS NOT NULL
+                FOR UPDATE
+            )
+            INSERT INTO daily_user_rollups AS r
+                (user_id, day, client, category, minutes, productivity_sum, productivity_count, task_count)
+            SELECT a.user_id,
+                   a.start_time::date,
+                   COALESCE(a.client_identified, ''),
+                   COALESCE(a.category, ''),
+                   p_sign * COALESCE(a.duration_minutes, 0),
+                   p_sign * COALESCE(a.productivity_score, 0),
+                   p_sign * (a.productivity_score IS NOT NULL)::int,
+                   p_sign
+            FROM a
+            ON CONFLICT (user_id, day, client, category) DO UPDATE
+            SET minutes = r.minutes + EXCLUDED.minutes,
+                productivity_sum = r.productivity_sum + EXCLUDED.productivity_sum,
+                productivity_count = r.productivity_count + EXCLUDED.productivity_count,
+                task_count = r.task_count + EXCLUDED.task_count;
+        END
+        $$
+    """)
+
+
+def retract(cur, activity_id: int, start_time: Optional[datetime] = None):
+    """Remove an activity's current contribution (call before UPDATE-ing it). Pass start_time when known."""
+    cur.execute("SELECT apply_activity_rollup(%s, -1, %s)", (activity_id, start_time))
+
+
+def apply(cur, activity_id: int, start_time: Optional[datetime] = None):
+    """Add an activity's current contribution (call after INSERT / UPDATE). Pass start_time when known."""
+    cur.execute("SELECT apply_activity_rollup(%s, 1, %s)", (activity_id, start_time))
+
+
+async def apply_async(tx, activity_id: int, start_time: Optional[datetime] = None):
+    """apply() inside an endpoint's database.transaction()."""
+    await tx.execute("SELECT apply_activity_rollup(%s, 1, %s)", (activity_id, start_time))
+
+
+def rebuild(cur, user_id: Optional[int] = None, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Recompute rollups from raw activities for [start, end] (inclusive days), optionally
+    for one user. Takes an EXCLUSIVE lock so concurrent writers wait instead of
+    double-counting. Returns the number of rollup rows written.
+    """
+    cur.execute("LOCK TABLE daily_user_rollups IN EXCLUSIVE MODE")
+
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if start is not None:
+        conditions.append("day >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("day <= %s")
+        params.append(end)
+    where = " AND ".join(conditions) or "TRUE"
+
+    cur.execute(f"DELETE FROM daily_user_rollups WHERE {where}", params)
+
+    # Same filters against raw activities, as an index-friendly start_time range
+    act_conditions, act_params = ["user_id IS NOT NULL", "start_time IS NOT NULL"], []
+    if user_id is not None:
+        act_conditions.append("user_id = %s")
+        act_params.append(user_id)
+    if start is not None:
+        act_conditions.append("start_time >= %s")
+        act_params.append(datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        act_conditions.append("start_time < %s")
+        act_params.append(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    cur.execute(f"""
+        INSERT INTO daily_user_rollups
+            (user_id, day, client, category, minutes, productivity_sum, productivity_count, task_count)
+        SELECT user_id,
+               start_time::date,
+               COALESCE(client_identified, ''),
+               COALESCE(category, ''),
+               COALESCE(SUM(duration_minutes), 0),
+               COALESCE(SUM(productivity_score), 0),
+               COUNT(productivity_score),
+               COUNT(*)
+        FROM activities
+        WHERE {" AND ".join(act_conditions)}
+        GROUP BY 1, 2, 3, 4
+    """, act_params)
+    return cur.rowcount
+
+
+def _parse_day(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain daily_user_rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebuild", help="recompute rollups from activities")
+    rb.add_argument("--user", type=int, default=None)
+    rb.add_argument("--from", dest="start", type=_parse_day, default=None)
+    rb.add_argument("--to", dest="end", type=_parse_day, default=None)
+    args = parser.parse_args(argv)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        rows = rebuild(cur, args.user, args.start, args.end)
+        conn.commit()
+        print(f"Rebuilt {rows} rollup row(s)")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,23 @@
 # screen_tracker.py
 # import cv2
-import numpy as np
 # import pyautogui
-import pytesseract
+# Imaging / OS libraries (Pillow, mss, psutil, pywin32) are imported inside the desktop
+# methods that need them, so the API can import this module without loading them.
 import time
-import psycopg2
-import requests
 import json
 from datetime import datetime
-import psutil
 import sys
-if sys.platform == "win32":
-    import win32gui
-    import win32process
-else:
-    win32gui = None
-    win32process = None
-
-from PIL import Image, ImageGrab
 from dataclasses import dataclass
 from typing import Dict, Optional
 import os
 from dotenv import load_dotenv
+from .db_pool import get_connection
+from .analyzer import ActivityAnalyzer
+from .frame_dedup import frame_dedup
+from . import rollups
 
 
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
 
 @dataclass
 class ActivitySession:
@@ -42,94 +34,27 @@ class ActivitySession:
     user_id: int
     duration_minutes: Optional[float] = None
 
-class AITimeTracker:
+class AITimeTracker(ActivityAnalyzer):
+    """Desktop tracking loop (window polling, screenshots, sessions) on top of ActivityAnalyzer."""
+
     def __init__(self):
-        self.api_key = os.getenv("GROQ_API_KEY")
+        super().__init__()
         self.is_tracking = False
         self.current_session = None
         self.screenshot_interval = 5
         self.current_user_id: Optional[int] = None
-        self.init_database()
     
 
     def db(self):
-        return psycopg2.connect(DATABASE_URL)
-
-    def init_database(self):
-        conn = self.db()
-        cur = conn.cursor()
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            name TEXT,
-            email TEXT UNIQUE,
-            password_hash TEXT,
-            role TEXT CHECK(role IN ('employee','admin')) NOT NULL DEFAULT 'employee'
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS activities (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            start_time TIMESTAMP,
-            end_time TIMESTAMP,
-            application TEXT,
-            window_title TEXT,
-            screenshot_path TEXT,
-            extracted_text TEXT,
-            ai_analysis JSONB,
-            client_identified TEXT,
-            category TEXT,
-            productivity_score INTEGER,
-            duration_minutes INTEGER
-        )
-        """)
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS clients (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(255) UNIQUE NOT NULL,
-            contact_email VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS screenshots (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                activity_id INTEGER REFERENCES activities(id) ON DELETE SET NULL,
-                path TEXT NOT NULL,
-                taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-
-
-        conn.commit()
-        cur.close()
-        conn.close()
-
-    def match_client(self, client_name: str) -> str:
-        if not client_name:
-            return "None"
-
-        try:
-            conn = self.db()
-            cur = conn.cursor()
-            cur.execute("SELECT name FROM clients WHERE LOWER(name) = LOWER(%s) LIMIT 1;", (client_name,))
-            result = cur.fetchone()
-            cur.close()
-            conn.close()
-            return result[0] if result else "None"
-        except Exception as e:
-            print("DB Error in match_client:", str(e))
-            return "None"
+        # Shared, bounded pool (see db_pool.py); conn.close() returns it to the pool
+        return get_connection()
 
     def get_active_window_info(self):
-        if sys.platform == "win32" and win32gui and win32process:
+        if sys.platform == "win32":
             try:
+                import psutil
+                import win32gui
+                import win32process
                 hwnd = win32gui.GetForegroundWindow()
                 window_title = win32gui.GetWindowText(hwnd)
                 _, pid = win32process.GetWindowThreadProcessId(hwnd)
@@ -147,6 +72,7 @@ class AITimeTracker:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         os.makedirs("screenshots", exist_ok=True)
         path = f"screenshots/screenshot_{timestamp}.png"
+        from PIL import Image
 
         if sys.platform == "win32" or sys.platform == "darwin":
             from PIL import ImageGrab
@@ -178,138 +104,6 @@ class AITimeTracker:
         return path
 
 
-    def extract_text_from_screen(self, screenshot_path: str) -> str:
-        try:
-            image = Image.open(screenshot_path)
-            return pytesseract.image_to_string(image, lang='eng').strip()
-        except Exception:
-            return ""
-
-    def analyze_content_with_gpt(self, window_info: Dict, extracted_text: str, manual_override: bool = False):
-        try:
-            if manual_override:
-                # 🔥 For manual entries, only ask for AI-driven fields
-                prompt = f"""
-                You are an AI that analyzes user activity for productivity tracking.
-
-                Application: {window_info.get('application', '')}
-                Window Title: {window_info.get('window_title', '')}
-                Extracted Text: {extracted_text[:2000]}
-
-                Return ONLY a JSON object with the following keys:
-                - activity_type (string)
-                - productivity_level (integer from 1–10, where 1 = unproductive/idle, 10 = highly productive. 
-                  If the user is coding, designing, writing documents, attending meetings → score 7–10. 
-                  If browsing social media, YouTube, or unrelated apps → score 0–2. 
-                  If ambiguous but seems work-related (e.g., Chrome tab with project context) → default to 7.)
-                - category (string: Work, Communication, Research, Social, Idle/Leisure, etc.)
-
-                Example:
-                {{
-                    "activity_type": "coding",
-                    "productivity_level": 9,
-                    "category": "Work"
-                }}
-                """
-            
-            else:
-                prompt = f"""
-                You are an AI that analyzes user activity for productivity tracking.
-
-                Application: {window_info.get('application', '')}
-                Window Title: {window_info.get('window_title', '')}
-                Extracted Text: {extracted_text[:2000]}
-
-                Return ONLY a JSON object with the following keys:
-                - client_name (string)
-                - activity_type (string)
-                - productivity_level (integer from 1–10, where 1 = unproductive/idle, 10 = highly productive. 
-                  If the user is coding, designing, writing documents, attending meetings → score 7–10. 
-                  If browsing social media, YouTube, or unrelated apps → score 0–2. 
-                  If ambiguous but seems work-related (e.g., Chrome tab with project context) → default to 7.)
-                - description (string)
-                - project_or_task (string)
-                - category (string: Work, Communication, Research, Social, Idle/Leisure, etc.)
-
-                Example:
-                {{
-                    "client_name": "Acme Corp",
-                    "activity_type": "coding",
-                    "productivity_level": 9,
-                    "description": "User is writing Python code in VSCode",
-                    "project_or_task": "Backend API development",
-                    "category": "Work"
-                }}
-
-                Return only ONE JSON object with fields: client_name, activity_type, productivity_level, description, project_or_task, category.
-                Do not return an array or multiple objects.
-                """
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [
-                    {"role": "system", "content": "You analyze workplace activities and must always return strict JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 300,
-                "temperature": 0.2  # lower → more consistent JSON
-            }
-
-            resp = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-
-            print("##########################################")
-            # print("Status:", resp.status_code)
-            # print("Response JSON:", resp.json())
-            print(resp.status_code)
-            ai_response = resp.json()["choices"][0]["message"]["content"]
-            print(ai_response)
-
-            if resp.status_code == 200:
-                try:
-                    import re
-                    # Clean up code fences before parsing JSON
-                    clean_response = ai_response.strip()
-                    # Remove ```json ... ``` or ``` ... ```
-                    if clean_response.startswith("```"):
-                        clean_response = re.sub(r"^```(json)?", "", clean_response.strip(), flags=re.IGNORECASE).strip()
-                        clean_response = re.sub(r"```$", "", clean_response).strip()
-
-                    # ✅ Use AI JSON directly
-                    ai_analysis = json.loads(clean_response)
-                    # 🔥 If it's a list, take the first element
-                    if isinstance(ai_analysis, list) and len(ai_analysis) > 0:
-                        ai_analysis = ai_analysis[0]
-                    # ✅ Validate client name
-                    ai_analysis["client_name"] = self.match_client(ai_analysis.get("client_name"))
-                    return ai_analysis, ai_response
-                except Exception as e:
-                    print("LLM Exception1:", str(e))
-                    # If LLM didn’t return proper JSON, fallback
-                    return self.get_fallback_analysis(window_info), ai_response
-            
-            print("LLM Error:", resp.status_code, resp.text)
-            return self.get_fallback_analysis(window_info), ai_response
-
-        except Exception as e:
-            print("LLM Exception2:", str(e))
-            return self.get_fallback_analysis(window_info), "Some Exception"
-
-
-    def get_fallback_analysis(self, window_info: Dict) -> Dict:
-        app = (window_info['application'] or "").lower()
-        if "word" in app or "excel" in app or 'teams' in app:
-            return {"client_name": "None", "activity_type": "document_editing", "productivity_level": 8, "description": f"Working with {app}", "project_or_task": "Unknown", "category": "Work"}
-        return {"client_name": "None", "activity_type": "general_work", "productivity_level": 7, "description": f"Working with {app}", "project_or_task": "Unknown", "category": "Work"}
-
     def save_session(self, session: ActivitySession):
         conn = self.db()
         cur = conn.cursor()
@@ -319,6 +113,7 @@ class AITimeTracker:
         cur.execute("""
         INSERT INTO activities (user_id, start_time, end_time, application, window_title, screenshot_path, extracted_text, ai_analysis, client_identified, category, productivity_score, duration_minutes)
         VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        RETURNING id
         """, (
             session.user_id,
             session.start_time,
@@ -333,6 +128,7 @@ class AITimeTracker:
             session.productivity_score,
             duration
         ))
+        rollups.apply(cur, cur.fetchone()[0])
         conn.commit()
         cur.close()
         conn.close()
@@ -352,8 +148,17 @@ class AITimeTracker:
                     self.save_session(self.current_session)
                 screenshot_path = self.capture_screenshot(self.current_user_id)
                 print("Screenshot Saved.")
-                extracted_text = self.extract_text_from_screen(screenshot_path)
-                ai_analysis, ai_response = self.analyze_content_with_gpt(window_info, extracted_text)
+                with open(screenshot_path, "rb") as f:
+                    image_bytes = f.read()
+                frame_hash = frame_dedup.fingerprint(image_bytes)
+                reuse = frame_dedup.lookup(self.current_user_id or 0, frame_hash)
+                if reuse:
+                    # ♻️ Near-identical to the last analyzed frame → skip OCR + LLM
+                    extracted_text, ai_analysis, ai_response = reuse.extracted_text, dict(reuse.ai_analysis), reuse.ai_response
+                else:
+                    extracted_text = self.extract_text_from_screen(screenshot_path, image_bytes)
+                    ai_analysis, ai_response = self.analyze_content_with_gpt(window_info, extracted_text)
+                    frame_dedup.remember(self.current_user_id or 0, frame_hash, extracted_text, ai_analysis, ai_response)
                 print("AI RESPONSE: ^^^^^^^^^^^^^^^^^^")
                 print(ai_response)
                 self.current_session = ActivitySession(
@@ -0,0 +1,118 @@
+# serializers.py
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON — orjson when installed, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when available (datetimes, Decimals and tuples
+    handled natively / via _default). Return it directly from an endpoint so FastAPI
+    skips its jsonable_encoder pass over every row.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ====== Column converters ======
+def _ai_analysis(value):
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return json.loads(value)
+        except Exception:
+            return {}
+    return {}
+
+
+def _client(value):
+    if isinstance(value, dict):
+        return value.get("client_name", "None")
+    return value
+
+
+def _score(value):
+    try:
+        return int(value)
+    except Exception:
+        return 5
+
+
+def _duration(open_value):
+    def convert(value):
+        return round(float(value), 2) if value is not None else open_value
+    return convert
+
+
+class ActivitySerializer:
+    """
+    Precompiled row → dict converter for activity queries.
+
+    Built once per column list: each column gets its converter (or none) up front, so
+    per-row work is a single dict comprehension instead of a chain of key checks.
+
+    - ai_analysis: always a JSON object ({} for NULL / unparsable)
+    - client_identified: legacy dict values collapse to their client_name
+    - productivity_score: int, defaulting to 5 (when coerce_score)
+    - duration_minutes: rounded to 2 places; NULL becomes `open_duration`
+    """
+
+    def __init__(self, columns: Sequence[str], coerce_score: bool = True, open_duration: Optional[float] = None):
+        converters: Dict[str, Callable] = {
+            "ai_analysis": _ai_analysis,
+            "client_identified": _client,
+            "duration_minutes": _duration(open_duration),
+        }
+        if coerce_score:
+            converters["productivity_score"] = _score
+        self.columns = tuple(columns)
+        self._plan = tuple((name, converters.get(name)) for name in self.columns)
+
+    def row(self, row: Sequence) -> Dict:
+        return {name: (conv(value) if conv else value) for (name, conv), value in zip(self._plan, row)}
+
+    def rows(self, rows: Iterable[Sequence]) -> List[Dict]:
+        plan = self._plan
+        return [
+            {name: (conv(value) if conv else value) for (name, conv), value in zip(plan, row)}
+            for row in rows
+        ]
+
+
+# Bounded: columns come from a client's `fields=` projection (validated and ordered by
+# project_fields, but any subset is allowed), so an unbounded dict grows per subset seen
+@lru_cache(maxsize=128)
+def _cached_serializer(columns: tuple, coerce_score: bool, open_duration: Optional[float]) -> ActivitySerializer:
+    return ActivitySerializer(columns, coerce_score, open_duration)
+
+
+def activity_serializer(columns: Sequence[str], coerce_score: bool = True,
+                        open_duration: Optional[float] = None) -> ActivitySerializer:
+    """Cached ActivitySerializer per (columns, options) — projections repeat, so build each plan once."""
+    return _cached_serializer(tuple(columns), coerce_score, open_duration)
@@ -0,0 +1,494 @@
+# sessions.py
+"""
+In-memory sessionization for uploaded frames.
+
+Each user with recent uploads has a UserSession: the activity their frames currently
+extend, its application / window title and when it was last seen. persist_upload asks
+the tracker whether a frame extends that activity or opens a new one, without first
+reading the user's latest activity from Postgres. State is warmed for everybody at
+startup and refreshed from every upload.
+
+The write itself is one statement: persist_upload_frame() takes a per-user advisory
+lock and extends or closes + opens the activity, logs the screenshot, keeps the rollups
+in step, queues the analysis job and returns the changed rows for the live event stream.
+An 'extend' is applied with a guarded UPDATE on the caller's (activity_id, start_time,
+end_time), with no read first. Only when the caller had no session, decided 'open' (the
+previous activity may still need closing), or the guard matched no row because another
+writer got there first does it read the user's latest activity and decide from that.
+
+A frame only extends an activity seen within SESSION_GAP_SECONDS; after a longer gap
+the next frame starts a new activity. The reaper thread forgets expired sessions and
+closes activities an agent left open (end_time NULL) when it went offline.
+
+Extension frames are not re-analysed by default: a new activity is analysed once, and
+later frames of the same window only bump end_time unless reanalysis_reason() fires —
+every Nth frame, after T seconds, or when the screen content changed noticeably.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from .db_pool import get_connection
+from .activity_fields import ACTIVITIES_COLUMNS, EVENT_SELECT
+from .serializers import activity_serializer
+from .events import publish_activities
+from .frame_dedup import hamming
+from . import rollups
+
+
+load_dotenv()
+
+# ====== Session config ======
+SESSION_GAP_SECONDS = float(os.getenv("SESSION_GAP_SECONDS", "300"))      # inactivity that ends a session
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "60"))   # seconds between reaper passes
+SESSION_REAP_BATCH = int(os.getenv("SESSION_REAP_BATCH", "500"))          # orphaned activities closed per pass
+
+# ====== Re-analysis policy for extension frames (0 disables a trigger) ======
+REANALYZE_EVERY_N_FRAMES = int(os.getenv("REANALYZE_EVERY_N_FRAMES", "10"))     # frames since the last analysis
+REANALYZE_AFTER_SECONDS = float(os.getenv("REANALYZE_AFTER_SECONDS", "600"))    # age of the last analysis
+REANALYZE_MIN_DISTANCE = int(os.getenv("REANALYZE_MIN_DISTANCE", "32"))         # dHash bits changed since then
+
+# Manual entries are not tracking sessions; rows from before entry_type existed are NULL
+_TRACKED = "entry_type IS DISTINCT FROM 'Manual Entry'"
+
+
+@dataclass
+class UserSession:
+    activity_id: int
+    application: Optional[str]
+    window_title: Optional[str]
+    start_time: datetime
+    end_time: Optional[datetime]   # what we last wrote; NULL while the activity is open
+    seen_at: float = field(default_factory=time.monotonic)   # of the last frame
+    # re-analysis bookkeeping; a session loaded from the DB counts as freshly analysed
+    frames_since_analysis: int = 0
+    analyzed_at: float = field(default_factory=time.monotonic)
+    analyzed_hash: Optional[int] = None
+
+    @property
+    def last_seen_at(self) -> datetime:
+        return self.end_time or self.start_time
+
+
+def _persist_upload_frame_sql(by_start_time: bool, job_start_time: bool = False,
+                              trust_session: bool = False) -> str:
+    # Rows come back as (kind, activity_id, start_time, end_time, verified, analyzed, job_id,
+    # activity) — kind is 'closed' / 'updated' / 'created', activity the EVENT_SELECT row as JSON.
+    # by_start_time: row lookups also match start_time, the partition key (migration 10);
+    # job_start_time: queued jobs record it too (migration 11);
+    # trust_session: an 'extend' claims the caller's activity with a guarded UPDATE and only
+    # falls back to reading the latest activity when that matches no row (migration 12)
+    row = " AND start_time = v_start" if by_start_time else ""
+    key = ", v_start" if by_start_time else ""
+    returning = "id, start_time INTO v_id, v_start" if by_start_time else "id INTO v_id"
+    job_key = ", v_start" if job_start_time else ""
+    expected_start = claimed = claim = fallback_end = ""
+    if trust_session:
+        expected_start = " p_expected_start TIMESTAMP,"
+        claimed = "            v_claimed BOOLEAN := FALSE;\n"
+        claim = f"""            -- The caller's session is trusted for an extension: the guarded UPDATE matches
+            -- only while its activity still ends where the caller last wrote it and nothing
+            -- newer was opened (another worker can open one without touching this row).
+            -- The retraction is re-applied either way, so a miss leaves the rollups as they were.
+            IF p_decision = 'extend' AND p_expected_id IS NOT NULL THEN
+                PERFORM apply_activity_rollup(p_expected_id, -1, p_expected_start);
+                UPDATE activities
+                SET end_time = NOW(),
+                    duration_minutes = ROUND(EXTRACT(EPOCH FROM (NOW() - start_time)) / 60.0, 2),
+                    screenshot_path = p_path
+                WHERE id = p_expected_id AND start_time = p_expected_start AND user_id = p_user_id
+                  AND end_time IS NOT DISTINCT FROM p_expected_end
+                  AND NOT EXISTS (
+                      SELECT 1 FROM activities n
+                      WHERE n.user_id = p_user_id AND n.start_time > p_expected_start AND n.{_TRACKED}
+                  )
+                RETURNING id, start_time INTO v_id, v_start;
+                v_claimed := FOUND;
+                IF v_claimed THEN
+                    v_kind := 'updated';
+                    v_verified := TRUE;
+                    v_analyze := p_reanalyze;
+                    IF v_analyze AND p_reuse THEN
+                        UPDATE activities
+                        SET extracted_text = p_extracted_text,
+                            ai_analysis = p_analysis,
+                            client_identified = p_client,
+                            category = p_category,
+                            productivity_score = p_score
+                        WHERE id = v_id AND start_time = v_start;
+                    END IF;
+                END IF;
+                PERFORM apply_activity_rollup(p_expected_id, 1, p_expected_start);
+            END IF;
+
+            -- No session, an 'open', or the claim missed: decide against the latest activity
+            IF NOT v_claimed THEN
+"""
+        fallback_end = "            END IF;\n\n"
+    return f"""
+        CREATE OR REPLACE FUNCTION persist_upload_frame(
+            p_user_id INTEGER, p_application TEXT, p_window_title TEXT, p_path TEXT,
+            p_decision TEXT, p_expected_id INTEGER,{expected_start} p_expected_end TIMESTAMP,
+            p_reanalyze BOOLEAN, p_reuse BOOLEAN, p_gap_seconds DOUBLE PRECISION,
+            p_extracted_text TEXT, p_analysis JSONB, p_client TEXT, p_category TEXT, p_score INTEGER
+        )
+        RETURNS TABLE (
+            o_kind TEXT, o_activity_id INTEGER, o_start_time TIMESTAMP, o_end_time TIMESTAMP,
+            o_verified BOOLEAN, o_analyzed BOOLEAN, o_job_id INTEGER, o_activity JSONB
+        )
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            v_id INTEGER;
+            v_application TEXT;
+            v_window_title TEXT;
+            v_start TIMESTAMP;
+            v_end TIMESTAMP;
+            v_close TIMESTAMP;
+            v_kind TEXT;
+            v_verified BOOLEAN;
+            v_analyze BOOLEAN := TRUE;
+            v_job INTEGER;
+            v_gap INTERVAL := make_interval(secs => p_gap_seconds);
+{claimed}        BEGIN
+            -- Overlapping uploads from one user (any API worker) queue here, so only one opens
+            PERFORM pg_advisory_xact_lock(hashtext('persist_upload_frame'), p_user_id);
+
+{claim}            SELECT id, application, window_title, start_time, end_time
+            INTO v_id, v_application, v_window_title, v_start, v_end
+            FROM activities
+            WHERE user_id = p_user_id AND {_TRACKED}
+            ORDER BY start_time DESC
+            LIMIT 1;
+
+            -- The caller's decision stands while its session is still the user's latest write
+            v_verified := p_decision IS NOT NULL
+                AND v_id IS NOT DISTINCT FROM p_expected_id
+                AND v_end IS NOT DISTINCT FROM p_expected_end;
+            IF v_verified THEN
+                v_kind := CASE WHEN p_decision = 'extend' THEN 'updated' ELSE 'created' END;
+                v_analyze := p_decision = 'open' OR p_reanalyze;
+            ELSIF v_id IS NOT NULL
+                  AND v_application IS NOT DISTINCT FROM p_application
+                  AND v_window_title IS NOT DISTINCT FROM p_window_title
+                  AND NOW() - COALESCE(v_end, v_start) <= v_gap THEN
+                -- no policy state for this session: treat it as freshly analysed
+                v_kind := 'updated';
+                v_analyze := FALSE;
+            ELSE
+                v_kind := 'created';
+            END IF;
+
+            IF v_kind = 'updated' THEN
+                PERFORM apply_activity_rollup(v_id, -1{key});
+                UPDATE activities
+                SET end_time = NOW(),
+                    duration_minutes = ROUND(EXTRACT(EPOCH FROM (NOW() - start_time)) / 60.0, 2),
+                    screenshot_path = p_path
+                WHERE id = v_id{row};
+                IF v_analyze AND p_reuse THEN
+                    UPDATE activities
+                    SET extracted_text = p_extracted_text,
+                        ai_analysis = p_analysis,
+                        client_identified = p_client,
+                        category = p_category,
+                        productivity_score = p_score
+                    WHERE id = v_id{row};
+                END IF;
+                PERFORM apply_activity_rollup(v_id, 1{key});
+            ELSE
+                IF v_id IS NOT NULL AND v_end IS NULL THEN
+                    -- after a gap the previous activity ends when it was last seen rather than now
+                    v_close := CASE WHEN NOW() - v_start > v_gap THEN v_start ELSE NOW() END;
+                    PERFORM apply_activity_rollup(v_id, -1{key});
+                    UPDATE activities
+                    SET end_time = v_close,
+                        duration_minutes = ROUND(EXTRACT(EPOCH FROM (v_close - start_time)) / 60.0, 2)
+                    WHERE id = v_id{row};
+                    PERFORM apply_activity_rollup(v_id, 1{key});
+                    RETURN QUERY
+                        SELECT 'closed'::TEXT, e.id, e.start_time, e.end_time, v_verified, FALSE, NULL::INTEGER, to_jsonb(e)
+                        FROM (SELECT {EVENT_SELECT} FROM activities WHERE id = v_id{row}) e;
+                END IF;
+
+                INSERT INTO activities (
+                    user_id, start_time, application, window_title,
+                    screenshot_path, extracted_text, ai_analysis,
+                    client_identified, category, productivity_score,
+                    entry_type
+                )
+                VALUES (p_user_id, NOW(), p_application, p_window_title, p_path, p_extracted_text,
+                        p_analysis, p_client, p_category, p_score, 'Automated Entry')
+                RETURNING {returning};
+                PERFORM apply_activity_rollup(v_id, 1{key});
+            END IF;
+
+{fallback_end}            INSERT INTO screenshots (user_id, activity_id, path, taken_at)
+            VALUES (p_user_id, v_id, p_path, NOW());
+
+            IF v_analyze AND NOT p_reuse THEN
+                v_job := enqueue_analysis_job(v_id, p_user_id, p_path, p_application, p_window_title{job_key});
+            END IF;
+
+            RETURN QUERY
+                SELECT v_kind, e.id, e.start_time, e.end_time, v_verified, v_analyze, v_job, to_jsonb(e)
+                FROM (SELECT {EVENT_SELECT} FROM activities WHERE id = v_id{row}) e;
+        END
+        $$
+    """
+
+
+def ensure_schema(cur):
+    cur.execute(_persist_upload_frame_sql(by_start_time=False))
+
+
+def ensure_partition_lookups(cur):
+    """Migration 10: persist_upload_frame() finds its rows by (id, start_time) on the partitioned activities."""
+    cur.execute(_persist_upload_frame_sql(by_start_time=True))
+
+
+def ensure_job_start_time(cur):
+    """Migration 11: persist_upload_frame() passes the activity's start_time to the jobs it queues."""
+    cur.execute(_persist_upload_frame_sql(by_start_time=True, job_start_time=True))
+
+
+def ensure_session_claim(cur):
+    """Migration 12: persist_upload_frame() extends the caller's session without reading the latest activity first."""
+    # p_expected_start is new (the claim's partition key); drop the 15-argument form
+    cur.execute("""
+        DROP FUNCTION IF EXISTS persist_upload_frame(
+            INTEGER, TEXT, TEXT, TEXT, TEXT, INTEGER, TIMESTAMP, BOOLEAN, BOOLEAN,
+            DOUBLE PRECISION, TEXT, JSONB, TEXT, TEXT, INTEGER
+        )
+    """)
+    cur.execute(_persist_upload_frame_sql(by_start_time=True, job_start_time=True, trust_session=True))
+
+
+class SessionTracker:
+    def __init__(self, gap_seconds: float = SESSION_GAP_SECONDS):
+        self.gap_seconds = gap_seconds
+        self._sessions: Dict[int, Optional[UserSession]] = {}   # None → user has no tracked activity
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # metrics
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._expired = 0
+        self._reaped = 0
+        self._reanalyzed = {"frames": 0, "age": 0, "content": 0}
+        self._skipped = 0
+
+    # ---- decisions ----
+    def user_lock(self, user_id: int) -> asyncio.Lock:
+        """
+        Serialises one user's uploads in-process so decide → write → remember stays coherent.
+        Awaited on the event loop: a waiting upload holds neither a thread nor a connection.
+        """
+        with self._lock:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = asyncio.Lock()
+            return lock
+
+    def is_expired(self, session: UserSession) -> bool:
+        return time.monotonic() - session.seen_at > self.gap_seconds
+
+    def cached(self, user_id: int) -> Tuple[bool, Optional[UserSession]]:
+        """
+        (known, session) from memory only. An unknown user is not loaded here —
+        persist_upload_frame() decides from the database in the same statement.
+        """
+        with self._lock:
+            if user_id in self._sessions:
+                self._hits += 1
+                return True, self._sessions[user_id]
+            self._misses += 1
+            return False, None
+
+    def decide(self, session: Optional[UserSession], application: str, window_title: str) -> str:
+        """'extend' the session's activity with this frame, or 'open' a new one."""
+        if session is None:
+            return "open"
+        if self.is_expired(session):
+            with self._lock:
+                self._expired += 1
+            return "open"
+        if session.application == application and session.window_title == window_title:
+            return "extend"
+        return "open"
+
+    def reanalysis_reason(self, session: UserSession, frame_hash: Optional[int]) -> Optional[str]:
+        """Why an extension frame should be analysed again, or None to just extend."""
+        reason = None
+        if REANALYZE_EVERY_N_FRAMES and session.frames_since_analysis + 1 >= REANALYZE_EVERY_N_FRAMES:
+            reason = "frames"
+        elif REANALYZE_AFTER_SECONDS and time.monotonic() - session.analyzed_at >= REANALYZE_AFTER_SECONDS:
+            reason = "age"
+        elif (REANALYZE_MIN_DISTANCE and frame_hash is not None and session.analyzed_hash is not None
+              and hamming(frame_hash, session.analyzed_hash) >= REANALYZE_MIN_DISTANCE):
+            reason = "content"
+        with self._lock:
+            if reason:
+                self._reanalyzed[reason] += 1
+            else:
+                self._skipped += 1
+        return reason
+
+    def after_frame(self, previous: Optional[UserSession], session: UserSession, decided: bool,
+                    verified: bool, analyzed: bool, frame_hash: Optional[int]) -> UserSession:
+        """
+        Session state after a committed frame. `decided`: the caller had a session and
+        decided in memory; `verified`: persist_upload_frame() kept that decision.
+        """
+        if not verified:
+            if decided:
+                with self._lock:
+                    self._stale += 1
+            previous = None  # the policy counters restart, as for a session loaded from the DB
+        if analyzed or previous is None or previous.activity_id != session.activity_id:
+            session.analyzed_hash = frame_hash
+        else:
+            session.frames_since_analysis = previous.frames_since_analysis + 1
+            session.analyzed_at = previous.analyzed_at
+            # no baseline yet (session loaded from the DB) → compare later frames to this one
+            session.analyzed_hash = previous.analyzed_hash if previous.analyzed_hash is not None else frame_hash
+        return session
+
+    def remember(self, user_id: int, session: Optional[UserSession]):
+        """Record the state after the caller's transaction committed."""
+        with self._lock:
+            self._sessions[user_id] = session
+
+    def forget(self, user_id: int):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    # ---- warm-up / reaping ----
+    def warm(self):
+        """Load every user's latest tracked activity in one query (LATERAL probe per user)."""
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT u.id, la.id, la.application, la.window_title, la.start_time, la.end_time,
+                       EXTRACT(EPOCH FROM (NOW() - COALESCE(la.end_time, la.start_time)))
+                FROM users u
+                JOIN LATERAL (
+                    SELECT id, application, window_title, start_time, end_time
+                    FROM activities
+                    WHERE user_id = u.id AND {_TRACKED}
+                    ORDER BY start_time DESC
+                    LIMIT 1
+                ) la ON TRUE
+            """)
+            now = time.monotonic()
+            loaded = 0
+            for r in cur.fetchall():
+                age = float(r[6] or 0)
+                if age > self.gap_seconds:
+                    continue  # already expired; the database decides if that user ever uploads again
+                self.remember(r[0], UserSession(r[1], r[2], r[3], r[4], r[5], now - age))
+                loaded += 1
+            conn.commit()
+            print(f"Session tracker warmed with {loaded} active session(s)")
+        finally:
+            cur.close()
+            conn.close()
+
+    def reap(self) -> int:
+        """
+        Forget sessions idle longer than the gap, then close activities an agent left
+        open past the gap. A still-open activity has exactly one frame (any later frame
+        sets end_time), so it ends at its start_time. Returns the number closed.
+        """
+        with self._lock:
+            for user_id in [u for u, s in self._sessions.items() if s is None or self.is_expired(s)]:
+                del self._sessions[user_id]
+
+        conn = get_connection()
+        cur = conn.cursor()
+        closed = []
+        try:
+            cur.execute("""
+                SELECT id, start_time FROM activities
+                WHERE end_time IS NULL
+                  AND start_time < NOW() - make_interval(secs => %s)
+                  AND entry_type = 'Automated Entry'
+                ORDER BY start_time
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (self.gap_seconds, SESSION_REAP_BATCH))
+            for activity_id, start_time in cur.fetchall():
+                rollups.retract(cur, activity_id, start_time)
+                cur.execute(f"""
+                    UPDATE activities
+                    SET end_time = start_time, duration_minutes = 0
+                    WHERE id = %s AND start_time = %s
+                    RETURNING {EVENT_SELECT}
+                """, (activity_id, start_time))
+                closed.append(cur.fetchone())
+                rollups.apply(cur, activity_id, start_time)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+        if closed:
+            with self._lock:
+                self._reaped += len(closed)
+            serializer = activity_serializer(ACTIVITIES_COLUMNS)
+            publish_activities([("activity.closed", serializer.row(row)) for row in closed])
+            print(f"Session reaper closed {len(closed)} abandoned activit{'y' if len(closed) == 1 else 'ies'}")
+        return len(closed)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        try:
+            self.warm()
+        except Exception as e:
+            print("Session tracker warm-up failed (sessions load on demand):", str(e))
+        self._thread = threading.Thread(target=self._reap_loop, name="session-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _reap_loop(self):
+        while not self._stopping.wait(SESSION_REAP_INTERVAL):
+            try:
+                self.reap()
+            except Exception as e:
+                print("Session reaper failed:", str(e))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": sum(1 for s in self._sessions.values() if s is not None),
+                "gap_seconds": self.gap_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "stale_decisions": self._stale,
+                "expired": self._expired,
+                "reaped": self._reaped,
+                "reanalyzed": dict(self._reanalyzed),
+                "extensions_not_reanalyzed": self._skipped,
+            }
+
+
+session_tracker = SessionTracker()
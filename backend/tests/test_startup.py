@@ -0,0 +1,23 @@
+# test_startup.py
+"""
+Import-time regression guard for the API (see benchmarks/bench_startup.py): a cold
+`import backend.api_server` must stay within STARTUP_IMPORT_BUDGET and leave the OCR /
+imaging stack unloaded until first use.
+"""
+import statistics
+
+from backend.benchmarks.bench_startup import LAZY_MODULES, STARTUP_IMPORT_BUDGET, measure_once
+
+RUNS = 3
+
+
+def test_heavy_modules_load_lazily():
+    loaded = measure_once()["loaded"]
+    assert loaded == [], f"imported at startup but should load lazily: {', '.join(loaded)} (of {LAZY_MODULES})"
+
+
+def test_import_time_within_budget():
+    median = statistics.median(measure_once()["seconds"] for _ in range(RUNS))
+    assert median <= STARTUP_IMPORT_BUDGET, (
+        f"median import time {median:.3f}s is over the {STARTUP_IMPORT_BUDGET:.3f}s budget"
+    )
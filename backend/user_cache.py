@@ -0,0 +1,132 @@
+# user_cache.py
+"""
+Per-process cache of the user rows behind get_current_user.
+
+Role, name and email changes and deletions don't go through the API, so a trigger on
+users bumps the `users` row in cache_versions (see client_index.py) whatever made the
+change. Each worker compares that counter at most every USER_CACHE_CHECK_INTERVAL seconds
+and drops its cache when it moved, which bounds how long a demoted or deleted user keeps
+their cached role. USER_CACHE_TTL still expires entries if the check keeps failing.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# ====== Auth cache config ======
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))            # seconds a looked-up user row stays valid
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+# How often (seconds) a worker asks Postgres whether a user row changed
+USER_CACHE_CHECK_INTERVAL = float(os.getenv("USER_CACHE_CHECK_INTERVAL", "5"))
+# Build the current user straight from signed token claims (sub/role/name/email) — zero DB reads,
+# but role/name changes only take effect on the next login
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "0") == "1"
+
+
+def ensure_schema(cur):
+    """Migration 13: bump cache_versions 'users' on every change to a cached user field."""
+    cur.execute("INSERT INTO cache_versions (name) VALUES ('users') ON CONFLICT (name) DO NOTHING")
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION users_cache_version_trigger()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE cache_versions SET version = version + 1, updated_at = NOW() WHERE name = 'users';
+            RETURN NULL;
+        END
+        $$
+    """)
+    # Statement-level, and not on password_hash: login's hash upgrade shouldn't flush every worker
+    cur.execute("DROP TRIGGER IF EXISTS users_cache_version ON users")
+    cur.execute("""
+        CREATE TRIGGER users_cache_version
+        AFTER UPDATE OF name, email, role OR DELETE ON users
+        FOR EACH STATEMENT EXECUTE FUNCTION users_cache_version_trigger()
+    """)
+
+
+class UserCache:
+    """Short-TTL cache of (id, name, email, role) tuples keyed by user id."""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_MAX_SIZE,
+                 check_interval: float = USER_CACHE_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self.check_interval = check_interval
+        self._users: Dict[int, Tuple[float, tuple]] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+        # metrics
+        self._hits = 0
+        self._misses = 0
+        self._claims = 0
+        self._flushes = 0
+
+    def get(self, user_id: int) -> Optional[tuple]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._users[user_id]
+            self._misses += 1
+            return None
+
+    def put(self, user_id: int, user: tuple):
+        with self._lock:
+            if len(self._users) >= self.max_size and user_id not in self._users:
+                # drop the entry closest to expiry
+                oldest = min(self._users, key=lambda k: self._users[k][0])
+                del self._users[oldest]
+            self._users[user_id] = (time.monotonic() + self.ttl, user)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Forget one user (role / profile change) or everyone (user_id=None)."""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def version_check_due(self) -> bool:
+        """True (once per interval, for one caller) when the users version should be read."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return False
+            self._checked_at = now
+            return True
+
+    def observe_version(self, version: int):
+        """Drop every cached user if the users version moved since the last check."""
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._users.clear()
+                self._flushes += 1
+            self._version = version
+
+    def record_claims_hit(self):
+        with self._lock:
+            self._claims += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "trust_token_claims": AUTH_TRUST_TOKEN_CLAIMS,
+                "entries": len(self._users),
+                "hits": self._hits,
+                "misses": self._misses,
+                "claims_only": self._claims,
+                "version": self._version,
+                "flushes": self._flushes,
+            }
+
+
+user_cache = UserCache()
@@ -114,6 +114,33 @@ const fetchTrackingStatus = async () => {
     fetchActivities(selectedDate);
   }, [selectedDate]);
 
+  // 📡 Live updates: merge pushed activity changes instead of refetching the day.
+  // all=false keeps the stream to the caller's own activities, admins included.
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    if (!token) return;
+
+    const source = new EventSource(
+      `${BASE_URL}/api/events?token=${encodeURIComponent(token)}&all=false`
+    );
+    const onActivity = (e) => {
+      const { activity } = JSON.parse(e.data);
+      if (!activity?.start_time?.startsWith(selectedDate)) return;
+      setActivities((prev) => {
+        const exists = prev.some((a) => a.id === activity.id);
+        const next = exists
+          ? prev.map((a) => (a.id === activity.id ? { ...a, ...activity } : a))
+          : [...prev, activity];
+        calculateSummary(next);
+        return next;
+      });
+    };
+    ["activity.created", "activity.updated", "activity.closed"].forEach((type) =>
+      source.addEventListener(type, onActivity)
+    );
+    return () => source.close();
+  }, [selectedDate]);
+
   // Utils
   const formatDuration = (minutes) => {
     if (!minutes) return "0m";
@@ -30,9 +30,9 @@ export default function AdminDashboard() {
   const [editingClient, setEditingClient] = useState(null);
   const [clientForm, setClientForm] = useState({ name: "", contact_email: "" });
 
-  // ✅ Fetch all users on mount
+  // ✅ Fetch all users with their day totals + tracking state (one request for the whole team)
   useEffect(() => {
-    fetch(`${BASE_URL}/api/admin/users`, {
+    fetch(`${BASE_URL}/api/admin/overview?date=${selectedDate}`, {
       headers: {
         Authorization: `Bearer ${localStorage.getItem("token")}`,
       },
@@ -46,7 +46,7 @@ export default function AdminDashboard() {
         }
       })
       .catch(() => setUsers([]));
-  }, []);
+  }, [selectedDate]);
 
   // ✅ Fetch activities & screenshots when user/date changes
   useEffect(() => {
@@ -74,6 +74,32 @@ export default function AdminDashboard() {
       .then((data) => setScreenshots(data || []));
   }, [selectedUser, selectedDate]);
 
+  // 📡 Live updates for the selected user/day instead of refetching the whole day
+  useEffect(() => {
+    if (!selectedUser) return;
+
+    const token = localStorage.getItem("token");
+    const source = new EventSource(
+      `${BASE_URL}/api/events?user_id=${selectedUser.id}&token=${encodeURIComponent(token)}`
+    );
+    const onActivity = (e) => {
+      const { activity } = JSON.parse(e.data);
+      if (!activity?.start_time?.startsWith(selectedDate)) return;
+      setActivities((prev) => {
+        const exists = prev.some((a) => a.id === activity.id);
+        const next = exists
+          ? prev.map((a) => (a.id === activity.id ? { ...a, ...activity } : a))
+          : [...prev, activity];
+        calculateSummary(next);
+        return next;
+      });
+    };
+    ["activity.created", "activity.updated", "activity.closed"].forEach((type) =>
+      source.addEventListener(type, onActivity)
+    );
+    return () => source.close();
+  }, [selectedUser, selectedDate]);
+
   // ✅ Fetch Clients
   const fetchClients = async () => {
     try {
@@ -283,7 +309,20 @@ return (
                       : "hover:bg-gray-200"
                   }`}
                 >
-                  {u.name || u.email}
+                  <div className="flex items-center justify-between">
+                    <span className="flex items-center gap-2">
+                      <span
+                        title={u.tracking?.is_tracking ? "Tracking" : "Idle"}
+                        className={`inline-block w-2 h-2 rounded-full ${
+                          u.tracking?.is_tracking ? "bg-green-500" : "bg-gray-400"
+                        }`}
+                      />
+                      {u.name || u.email}
+                    </span>
+                    {u.total_hours !== undefined && (
+                      <span className="text-xs opacity-75">{u.total_hours}h</span>
+                    )}
+                  </div>
                 </li>
               ))}
             </ul>